@@ -7,7 +7,9 @@ from gettext import gettext as _
 from gi.repository import Adw, Gdk, Gio, GLib, GObject, Gtk
 from typing import List, Optional
 
-from metadatacleaner.ui.window import Window
+from metadatacleaner.modules.batchservice import BatchService
+from metadatacleaner.modules.scheduler import Scheduler
+from metadatacleaner.modules.throughput import ThroughputDatabase
 
 
 class MetadataCleaner(Adw.Application):
@@ -39,6 +41,9 @@ class MetadataCleaner(Adw.Application):
         self.devel = devel
         self.version = version
         self.settings = Gio.Settings.new(self.get_application_id())
+        self.scheduler = Scheduler()
+        self.throughput = ThroughputDatabase()
+        self._batch_service: Optional[BatchService] = None
 
     # APPLICATION METHODS #
 
@@ -52,6 +57,28 @@ class MetadataCleaner(Adw.Application):
         self._setup_actions()
         self._setup_accels()
 
+    def do_dbus_register(
+            self,
+            connection: Gio.DBusConnection,
+            object_path: str) -> bool:
+        """Run when the application is exported on D-Bus."""
+        if not Adw.Application.do_dbus_register(
+                self, connection, object_path):
+            return False
+        self._batch_service = BatchService(self, connection, object_path)
+        self._batch_service.register()
+        return True
+
+    def do_dbus_unregister(
+            self,
+            connection: Gio.DBusConnection,
+            object_path: str) -> None:
+        """Run when the application is unexported from D-Bus."""
+        if self._batch_service:
+            self._batch_service.unregister()
+            self._batch_service = None
+        Adw.Application.do_dbus_unregister(self, connection, object_path)
+
     def do_open(self, gfiles: List[Gio.File], n_files: int, hint: str) -> None:
         """Run when files are passed to the command line."""
         self.new_window(gfiles=gfiles)
@@ -97,6 +124,8 @@ class MetadataCleaner(Adw.Application):
         self.add_action(quit_app)
 
         self.add_action(self.settings.create_action("lightweight-cleaning"))
+        self.add_action(self.settings.create_action("deduplicate-files"))
+        self.add_action(self.settings.create_action("mark-cleaned-files"))
 
     def _setup_accels(self) -> None:
         self.set_accels_for_action("app.help::/index", ["F1"])
@@ -107,6 +136,9 @@ class MetadataCleaner(Adw.Application):
         self.set_accels_for_action("win.clear-files", ["<Control>r"])
         self.set_accels_for_action("win.clean-metadata", ["<Control>m"])
         self.set_accels_for_action("win.close", ["<Control>w"])
+        if self.devel:
+            self.set_accels_for_action(
+                "win.show-inspector", ["<Control><Alt>i"])
 
     # PUBLIC #
 
@@ -117,6 +149,9 @@ class MetadataCleaner(Adw.Application):
             gfiles (List[Gio.File], optional): List of files to be added to the
                 new window. Defaults to None.
         """
+        # Imported only by the primary instance, as it imports libmat2
+        from metadatacleaner.ui.window import Window
+
         def on_window_destroyed(window) -> None:
             self.withdraw_notification(f"done{window.get_id()}")
         window = Window(application=self)
@@ -0,0 +1,280 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+r"""D-Bus service to clean files without user interface.
+
+The service is exported on the application object path, so that scripts can
+submit cleaning jobs to a running instance, e.g.:
+
+    gdbus call --session \
+        --dest fr.romainvigier.MetadataCleaner \
+        --object-path /fr/romainvigier/MetadataCleaner \
+        --method fr.romainvigier.MetadataCleaner.Batch.SubmitPaths \
+        "['/path/to/file']" "{'lightweight': <true>}"
+"""
+
+import os
+
+from collections import OrderedDict
+from gi.repository import Gio, GLib
+from itertools import count
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from metadatacleaner.modules.logger import Logger as logger
+
+# The File Store imports libmat2, which is slow to import, and the service is
+# also registered by instances handing their files over to the primary one
+if TYPE_CHECKING:
+    from metadatacleaner.modules.filestore import \
+        FileStore, FileStoreAction, FileStoreState
+
+
+INTERFACE_NAME = "fr.romainvigier.MetadataCleaner.Batch"
+
+_INTERFACE_XML = f"""
+<node>
+  <interface name="{INTERFACE_NAME}">
+    <method name="SubmitPaths">
+      <arg name="paths" type="as" direction="in"/>
+      <arg name="options" type="a{{sv}}" direction="in"/>
+      <arg name="job_id" type="s" direction="out"/>
+    </method>
+    <method name="GetJobStatus">
+      <arg name="job_id" type="s" direction="in"/>
+      <arg name="state" type="s" direction="out"/>
+      <arg name="current" type="u" direction="out"/>
+      <arg name="total" type="u" direction="out"/>
+      <arg name="cleaned" type="u" direction="out"/>
+      <arg name="errors" type="u" direction="out"/>
+    </method>
+    <method name="CancelJob">
+      <arg name="job_id" type="s" direction="in"/>
+    </method>
+    <signal name="JobProgress">
+      <arg name="job_id" type="s"/>
+      <arg name="current" type="u"/>
+      <arg name="total" type="u"/>
+    </signal>
+    <signal name="JobFinished">
+      <arg name="job_id" type="s"/>
+      <arg name="state" type="s"/>
+    </signal>
+  </interface>
+</node>
+"""
+
+_ERROR_UNKNOWN_JOB = f"{INTERFACE_NAME}.Error.UnknownJob"
+_ERROR_INVALID_ARGS = "org.freedesktop.DBus.Error.InvalidArgs"
+
+
+class _BatchJob:
+    """Cleaning job submitted to the batch service."""
+
+    def __init__(
+            self,
+            job_id: str,
+            file_store: "FileStore",
+            output_root: Optional[str]) -> None:
+        self.job_id = job_id
+        self.file_store = file_store
+        self.output_root = output_root
+        self.state = "adding"
+        self.progress = (0, 0)
+        self.cleaned = 0
+        self.errors = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("finished", "cancelled")
+
+
+class BatchService:
+    """D-Bus service to clean files without user interface.
+
+    Each job gets its own File Store, in which the files are added, then
+    cleaned. The application is held while jobs are running.
+    """
+
+    # Number of finished jobs whose status is kept
+    MAX_FINISHED_JOBS = 100
+
+    def __init__(
+            self,
+            application: Gio.Application,
+            connection: Gio.DBusConnection,
+            object_path: str) -> None:
+        """Batch service initialization.
+
+        Args:
+            application (Gio.Application): The application to hold while jobs
+                are running.
+            connection (Gio.DBusConnection): The connection to export the
+                service on.
+            object_path (str): The object path to export the service on.
+        """
+        self._application = application
+        self._connection = connection
+        self._object_path = object_path
+        self._registration_id = 0
+        self._job_ids = count(1)
+        self._jobs: Dict[str, _BatchJob] = OrderedDict()
+
+    def register(self) -> None:
+        """Export the service on the D-Bus connection."""
+        node_info = Gio.DBusNodeInfo.new_for_xml(_INTERFACE_XML)
+        self._registration_id = self._connection.register_object(
+            self._object_path,
+            node_info.interfaces[0],
+            self._on_method_call,
+            None,
+            None)
+
+    def unregister(self) -> None:
+        """Stop exporting the service and cancel the running jobs."""
+        for job in list(self._jobs.values()):
+            if not job.finished:
+                self._cancel_job(job)
+        if self._registration_id:
+            self._connection.unregister_object(self._registration_id)
+            self._registration_id = 0
+
+    def _on_method_call(
+            self,
+            connection: Gio.DBusConnection,
+            sender: str,
+            object_path: str,
+            interface_name: str,
+            method_name: str,
+            parameters: GLib.Variant,
+            invocation: Gio.DBusMethodInvocation) -> None:
+        args = parameters.unpack()
+        if method_name == "SubmitPaths":
+            self._submit_paths(invocation, *args)
+            return
+        job = self._jobs.get(args[0])
+        if job is None:
+            invocation.return_dbus_error(
+                _ERROR_UNKNOWN_JOB, f"No job with the ID {args[0]}.")
+        elif method_name == "GetJobStatus":
+            invocation.return_value(GLib.Variant("(suuuu)", (
+                job.state,
+                *job.progress,
+                job.cleaned,
+                job.errors)))
+        elif method_name == "CancelJob":
+            if not job.finished:
+                self._cancel_job(job)
+            invocation.return_value(None)
+
+    def _submit_paths(
+            self,
+            invocation: Gio.DBusMethodInvocation,
+            paths: List[str],
+            options: Dict) -> None:
+        invalid_paths = [
+            path for path in paths
+            if not os.path.isabs(path) or not os.path.exists(path)
+        ]
+        if invalid_paths:
+            invocation.return_dbus_error(
+                _ERROR_INVALID_ARGS,
+                "Paths must be absolute paths of existing files: "
+                + ", ".join(invalid_paths))
+            return
+        output_root = options.get("output-directory")
+        if output_root is not None and not os.path.isabs(output_root):
+            invocation.return_dbus_error(
+                _ERROR_INVALID_ARGS,
+                "The output directory must be an absolute path.")
+            return
+        from metadatacleaner.modules.filestore import FileStore
+        settings = self._application.get_property("settings")
+        file_store = FileStore(
+            self._application.scheduler,
+            self._application.throughput)
+        file_store.lightweight_mode = options.get(
+            "lightweight", settings.get_boolean("lightweight-cleaning"))
+        file_store.deduplicate = options.get(
+            "deduplicate", settings.get_boolean("deduplicate-files"))
+        file_store.mark_cleaned_files = options.get(
+            "mark-cleaned", settings.get_boolean("mark-cleaned-files"))
+        job = _BatchJob(str(next(self._job_ids)), file_store, output_root)
+        self._jobs[job.job_id] = job
+        self._forget_finished_jobs()
+        file_store.connect("progress-changed", self._on_progress_changed, job)
+        file_store.connect("state-changed", self._on_state_changed, job)
+        self._application.hold()
+        logger.info(
+            f"Batch job {job.job_id} submitted for {len(paths)} paths.")
+        file_store.add_gfiles(
+            [Gio.File.new_for_path(path) for path in paths],
+            recursive=options.get("recursive", True))
+        invocation.return_value(GLib.Variant("(s)", (job.job_id,)))
+
+    def _on_progress_changed(
+            self,
+            file_store: "FileStore",
+            action: "FileStoreAction",
+            current: int,
+            total: int,
+            bytes_done: int,
+            bytes_total: int,
+            job: _BatchJob) -> None:
+        from metadatacleaner.modules.filestore import FileStoreAction
+        job_action = FileStoreAction.ADDING if job.state == "adding" \
+            else FileStoreAction.CLEANING
+        if job.finished or action != job_action or total == 0:
+            return
+        job.progress = (current, total)
+        self._emit_signal(
+            "JobProgress", GLib.Variant("(suu)", (job.job_id, current, total)))
+
+    def _on_state_changed(
+            self,
+            file_store: "FileStore",
+            state: "FileStoreState",
+            job: _BatchJob) -> None:
+        from metadatacleaner.modules.filestore import FileStoreState
+        if job.finished or state != FileStoreState.IDLE:
+            return
+        if job.state == "adding":
+            job.state = "cleaning"
+            file_store.clean_files(job.output_root)
+        elif job.state == "cleaning":
+            self._finish_job(job, "finished")
+
+    def _cancel_job(self, job: _BatchJob) -> None:
+        if job.state == "adding":
+            job.file_store.cancel_addding_gfiles()
+        else:
+            job.file_store.cancel_cleaning_files()
+        self._finish_job(job, "cancelled")
+
+    def _finish_job(self, job: _BatchJob, state: str) -> None:
+        job.state = state
+        job.cleaned = len(job.file_store.get_cleaned_files())
+        job.errors = len(job.file_store.get_errored_files())
+        # Only the status of the job is kept
+        job.file_store.remove_files()
+        self._application.release()
+        logger.info(
+            f"Batch job {job.job_id} {state}: {job.cleaned} files cleaned, "
+            f"{job.errors} errors.")
+        self._emit_signal(
+            "JobFinished", GLib.Variant("(ss)", (job.job_id, state)))
+
+    def _forget_finished_jobs(self) -> None:
+        finished_jobs = [job for job in self._jobs.values() if job.finished]
+        for job in finished_jobs[:-self.MAX_FINISHED_JOBS]:
+            del self._jobs[job.job_id]
+
+    def _emit_signal(self, name: str, parameters: GLib.Variant) -> None:
+        try:
+            self._connection.emit_signal(
+                None,
+                self._object_path,
+                INTERFACE_NAME,
+                name,
+                parameters)
+        except GLib.Error as e:
+            logger.warning(f"Unable to emit the D-Bus signal {name}: {e}")
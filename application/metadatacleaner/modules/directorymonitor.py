@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Monitor of the changes in a directory."""
+
+import os
+
+from gi.repository import Gio, GLib, GObject
+from typing import Dict, List
+
+from metadatacleaner.modules.file import TEMP_FILE_PREFIX
+from metadatacleaner.modules.logger import Logger as logger
+
+
+class DirectoryMonitor(GObject.GObject):
+    """Monitor of the changes in a directory.
+
+    Changes are debounced: a file is only reported as changed once no change
+    happened to it for settle_delay milliseconds, so that files being written
+    are reported once the writing is done. Temporary files written while
+    cleaning are ignored.
+
+    The monitor relies on Gio.FileMonitor, so a GLib main loop has to run in
+    the thread it is created in.
+    """
+
+    __gtype_name__ = "DirectoryMonitor"
+
+    __gsignals__ = {
+        "files-changed": (
+            GObject.SIGNAL_RUN_LAST, None, (GObject.TYPE_PYOBJECT,)),
+        "files-deleted": (
+            GObject.SIGNAL_RUN_LAST, None, (GObject.TYPE_PYOBJECT,)),
+    }
+
+    def __init__(
+            self,
+            directory: Gio.File,
+            recursive: bool = False,
+            settle_delay: int = 2000) -> None:
+        """Directory monitor initialization.
+
+        Args:
+            directory (Gio.File): The directory to monitor.
+            recursive (bool, optional): If subdirectories, including the ones
+                created afterwards, should also be monitored. Defaults to
+                False.
+            settle_delay (int, optional): Delay in milliseconds without
+                changes after which a file is reported as changed. Defaults to
+                2000.
+        """
+        super().__init__()
+        self.directory = directory
+        self.recursive = recursive
+        self.settle_delay = settle_delay
+        self._monitors: Dict[str, Gio.FileMonitor] = {}
+        self._pending: Dict[str, int] = {}
+        self._settled: List[Gio.File] = []
+        self._deleted: List[Gio.File] = []
+        self._flush_source_id = 0
+        self._monitor_directory(directory)
+
+    def stop(self) -> None:
+        """Stop monitoring the directory."""
+        for monitor in self._monitors.values():
+            monitor.cancel()
+        self._monitors = {}
+        for source_id in self._pending.values():
+            GLib.source_remove(source_id)
+        self._pending = {}
+        if self._flush_source_id:
+            GLib.source_remove(self._flush_source_id)
+            self._flush_source_id = 0
+
+    def _monitor_directory(self, directory: Gio.File) -> None:
+        path = directory.get_path()
+        if path in self._monitors:
+            return
+        try:
+            monitor = directory.monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except GLib.Error as e:
+            logger.warning(f"Unable to monitor the directory {path}: {e}")
+            return
+        monitor.connect("changed", self._on_changed)
+        self._monitors[path] = monitor
+        if not self.recursive:
+            return
+        try:
+            enumerator = directory.enumerate_children(
+                Gio.FILE_ATTRIBUTE_STANDARD_TYPE,
+                Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS,
+                None)
+            for info in enumerator:
+                if info.get_file_type() == Gio.FileType.DIRECTORY:
+                    self._monitor_directory(enumerator.get_child(info))
+            enumerator.close(None)
+        except GLib.Error as e:
+            logger.warning(f"Unable to list the directory {path}: {e}")
+
+    def _on_changed(
+            self,
+            monitor: Gio.FileMonitor,
+            gfile: Gio.File,
+            other_gfile: Gio.File,
+            event_type: Gio.FileMonitorEvent) -> None:
+        if event_type in (
+                Gio.FileMonitorEvent.CREATED,
+                Gio.FileMonitorEvent.CHANGED,
+                Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+                Gio.FileMonitorEvent.MOVED_IN):
+            self._on_file_changed(gfile)
+        elif event_type in (
+                Gio.FileMonitorEvent.DELETED,
+                Gio.FileMonitorEvent.MOVED_OUT):
+            self._on_file_deleted(gfile)
+        elif event_type == Gio.FileMonitorEvent.RENAMED:
+            self._on_file_deleted(gfile)
+            self._on_file_changed(other_gfile)
+
+    def _on_file_changed(self, gfile: Gio.File) -> None:
+        if gfile.get_basename().startswith(TEMP_FILE_PREFIX):
+            return
+        path = gfile.get_path()
+        if path in self._pending:
+            GLib.source_remove(self._pending[path])
+
+        def settle() -> bool:
+            del self._pending[path]
+            f_type = gfile.query_file_type(
+                Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS, None)
+            if f_type == Gio.FileType.DIRECTORY and self.recursive:
+                self._monitor_directory(gfile)
+            elif f_type not in (
+                    Gio.FileType.REGULAR,
+                    Gio.FileType.DIRECTORY):
+                return GLib.SOURCE_REMOVE
+            self._settled.append(gfile)
+            self._schedule_flush()
+            return GLib.SOURCE_REMOVE
+        self._pending[path] = GLib.timeout_add(self.settle_delay, settle)
+
+    def _on_file_deleted(self, gfile: Gio.File) -> None:
+        if gfile.get_basename().startswith(TEMP_FILE_PREFIX):
+            return
+        path = gfile.get_path()
+        if path in self._pending:
+            GLib.source_remove(self._pending.pop(path))
+        # Forget the monitors of a deleted directory and its subdirectories
+        for monitored_path in list(self._monitors):
+            if monitored_path == path \
+                    or monitored_path.startswith(path + os.sep):
+                self._monitors.pop(monitored_path).cancel()
+        self._deleted.append(gfile)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_source_id:
+            return
+
+        def flush() -> bool:
+            self._flush_source_id = 0
+            deleted, self._deleted = self._deleted, []
+            settled, self._settled = self._settled, []
+            if deleted:
+                self.emit("files-deleted", deleted)
+            if settled:
+                self.emit("files-changed", settled)
+            return GLib.SOURCE_REMOVE
+        self._flush_source_id = GLib.idle_add(flush)
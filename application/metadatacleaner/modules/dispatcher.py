@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Dispatchers running the callbacks of the workers in the right context.
+
+Files and File Stores do their work in worker threads, and dispatch the
+updates of their properties and of the list of files, and the emission of
+their signals, to a dispatcher. The dispatcher chooses where these callbacks
+run: in the GLib main loop for the application, or elsewhere when the modules
+are used as a library.
+"""
+
+import asyncio
+
+from abc import ABC, abstractmethod
+from threading import RLock
+from typing import Any, Callable
+
+from metadatacleaner.modules.tracing import idle_add
+
+
+class Dispatcher(ABC):
+    """Runner of the callbacks dispatched by the workers.
+
+    Callbacks are run one at a time, in the order they were dispatched.
+    """
+
+    @abstractmethod
+    def dispatch(self, function: Callable, *args: Any) -> None:
+        """Run a callback.
+
+        Args:
+            function (Callable): The callback, returning None or
+                GLib.SOURCE_REMOVE.
+            *args: Arguments of the callback.
+        """
+
+
+class GLibDispatcher(Dispatcher):
+    """Dispatcher running the callbacks in the GLib main loop.
+
+    The main loop of the default main context must be running for the
+    callbacks to run.
+    """
+
+    def dispatch(self, function: Callable, *args: Any) -> None:
+        """Run a callback in the GLib main loop.
+
+        Args:
+            function (Callable): The callback. It must return None or
+                GLib.SOURCE_REMOVE.
+            *args: Arguments of the callback.
+        """
+        # Callbacks returning None or False are only run once
+        idle_add(function, *args)
+
+
+class ImmediateDispatcher(Dispatcher):
+    """Dispatcher running the callbacks right away, in the calling thread.
+
+    No main loop is needed, which suits scripts and batch tools. The callbacks
+    are run one at a time, so they still don't have to be thread-safe with
+    regard to each other, but signal handlers run in the worker threads.
+    """
+
+    def __init__(self) -> None:
+        """Immediate dispatcher initialization."""
+        # Reentrant, as callbacks can dispatch other callbacks
+        self._lock = RLock()
+
+    def dispatch(self, function: Callable, *args: Any) -> None:
+        """Run a callback in the calling thread.
+
+        Args:
+            function (Callable): The callback. Its return value is ignored.
+            *args: Arguments of the callback.
+        """
+        with self._lock:
+            function(*args)
+
+
+class AsyncioDispatcher(Dispatcher):
+    """Dispatcher running the callbacks in an asyncio event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Asyncio dispatcher initialization.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop running the
+                callbacks.
+        """
+        self.loop = loop
+
+    def dispatch(self, function: Callable, *args: Any) -> None:
+        """Run a callback in the event loop.
+
+        Args:
+            function (Callable): The callback. Its return value is ignored.
+            *args: Arguments of the callback.
+        """
+        self.loop.call_soon_threadsafe(function, *args)
+
+
+# Dispatcher of the Files and File Stores not given one
+DEFAULT_DISPATCHER: Dispatcher = GLibDispatcher()
@@ -3,21 +3,84 @@
 
 """File object and states."""
 
+import errno
 import hashlib
+import libmat2
 import os
 import re
+import shutil
 import tempfile
 
+from contextlib import nullcontext, suppress
 from enum import IntEnum, auto
+from functools import partial
 from gettext import gettext as _
 from gi.repository import Gio, GLib, GObject
 from libmat2 import parser_factory
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
 
+from metadatacleaner.modules.dispatcher import DEFAULT_DISPATCHER, Dispatcher
+from metadatacleaner.modules.filecopy import \
+    TEMP_FILE_PREFIX, clone_file, copy_file, link_file
 from metadatacleaner.modules.logger import Logger as logger
 from metadatacleaner.modules.metadata \
     import MetadataStore, MetadataFile, MetadataList, Metadata
+from metadatacleaner.modules.timings import Timings
+from metadatacleaner.modules.tracing import annotate, traced
+
+# Extended attribute marking a file as cleaned, stored as
+# "user.metadatacleaner.cleaned"
+CLEANED_MARKER_ATTRIBUTE = "xattr::metadatacleaner.cleaned"
+
+# Attributes needed to check the cleaned marker of a file
+CLEANED_MARKER_QUERY_ATTRIBUTES = ",".join((
+    Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
+    Gio.FILE_ATTRIBUTE_TIME_MODIFIED,
+    Gio.FILE_ATTRIBUTE_TIME_MODIFIED_USEC,
+    CLEANED_MARKER_ATTRIBUTE,
+))
+
+
+def _get_cleaned_marker(info: Gio.FileInfo) -> str:
+    mtime = (
+        info.get_attribute_uint64(Gio.FILE_ATTRIBUTE_TIME_MODIFIED)
+        * 1000000
+        + info.get_attribute_uint32(Gio.FILE_ATTRIBUTE_TIME_MODIFIED_USEC))
+    return f"{mtime} {info.get_size()} {libmat2.__version__}"
+
+
+def has_valid_cleaned_marker(info: Gio.FileInfo) -> bool:
+    """Check if a file has been marked as cleaned and is unchanged since.
+
+    Args:
+        info (Gio.FileInfo): Info of the file, queried with at least the
+            CLEANED_MARKER_QUERY_ATTRIBUTES.
+
+    Returns:
+        bool: True if the marker matches the modification time and size of
+            the file, and the current version of libmat2.
+    """
+    marker = info.get_attribute_string(CLEANED_MARKER_ATTRIBUTE)
+    return bool(marker) and marker == _get_cleaned_marker(info)
+
+
+def write_cleaned_marker(path: str) -> None:
+    """Mark a file as cleaned with an extended attribute.
+
+    Args:
+        path (str): Path of the cleaned file.
+    """
+    gfile = Gio.File.new_for_path(path)
+    info = gfile.query_info(
+        CLEANED_MARKER_QUERY_ATTRIBUTES,
+        Gio.FileQueryInfoFlags.NONE,
+        None)
+    gfile.set_attribute_string(
+        CLEANED_MARKER_ATTRIBUTE,
+        _get_cleaned_marker(info),
+        Gio.FileQueryInfoFlags.NONE,
+        None)
 
 
 class FileState(IntEnum):
@@ -36,6 +99,37 @@ class FileState(IntEnum):
     CLEANED = auto()
 
 
+# Function returning the parser handling a file and its mimetype, from the
+# path of the file
+GetParserFunction = Callable[[str], Tuple[Any, Optional[str]]]
+
+
+def _create_parser(
+        get_parser: GetParserFunction,
+        path: str) -> Tuple[Any, Optional[str]]:
+    parser, mimetype = get_parser(path)
+    # Disable sandbox in Flatpak, see
+    # https://github.com/flathub/fr.romainvigier.MetadataCleaner/pull/124
+    if parser and Path("/.flatpak-info").exists():
+        parser.sandbox = False
+    return parser, mimetype
+
+
+def _load_metadata_value(
+        get_parser: GetParserFunction,
+        path: str,
+        key: str,
+        member: Optional[str] = None) -> str:
+    # Only previews of the largest values are kept in memory, parse the file
+    # again to get the full value. The loader only knows the path of the file,
+    # so that the metadata don't keep the file alive.
+    parser, mimetype = _create_parser(get_parser, path)
+    metadata = parser.get_meta()
+    if member is not None:
+        metadata = metadata[member]
+    return str(metadata[key])
+
+
 class File(GObject.GObject):
     """File object."""
 
@@ -71,16 +165,32 @@ class File(GObject.GObject):
         nick="has-message",
         default=False)
 
-    def __init__(self, gfile: Gio.File) -> None:
+    def __init__(
+            self,
+            gfile: Gio.File,
+            root: Optional[str] = None,
+            get_parser: Optional[GetParserFunction] = None,
+            dispatcher: Optional[Dispatcher] = None) -> None:
         """File initialization.
 
         Args:
             gfile (Gio.File): The Gio File that the File will be built from.
+            root (str, optional): Directory the file was added from, used to
+                mirror the directory structure when writing the cleaned file
+                elsewhere. Defaults to the directory of the file.
+            get_parser (GetParserFunction, optional): Function returning the
+                parser handling the file and its mimetype. Defaults to
+                libmat2.parser_factory.get_parser.
+            dispatcher (Dispatcher, optional): Dispatcher running the updates
+                of the properties and the emissions of the signals. Defaults
+                to the GLib main loop.
         """
         super().__init__()
+        self._get_parser_function = get_parser or parser_factory.get_parser
+        self._dispatcher = dispatcher or DEFAULT_DISPATCHER
         self._gfile = gfile
-        self._temp_path = self._compute_temp_path(gfile.get_path())
         self.path = gfile.get_path()
+        self.root = root or os.path.dirname(self.path)
         self.filename = gfile.get_basename()
         self.directory = self._simplify_dir_path(gfile.get_path())
         self.display_directory = bool(self.directory)
@@ -89,12 +199,79 @@ class File(GObject.GObject):
         self.icon_name = Gio.content_type_get_generic_icon_name(self.mimetype)
         self.metadata = MetadataStore()
         self.error: Optional[Exception] = None
+        self.duplicate_of: Optional[File] = None
+        self.duplicates: List[File] = []
+        self.hardlinks: List[str] = []
+        self.size = 0
+        self.bytes_written = 0
+        self.timings: Optional[Timings] = None
+        self._parser: Optional[Any] = None
+
+    @property
+    def parser_name(self) -> Optional[str]:
+        """Name of the parser handling the file, if it has been set up."""
+        return type(self._parser).__name__ if self._parser else None
+
+    def add_duplicate(self, f: "File") -> None:
+        """Register a file having the same content as this file.
+
+        The duplicate mirrors the state and metadata of this file, and gets a
+        copy of the cleaned file instead of being cleaned itself.
+
+        Args:
+            f (File): The identical file.
+        """
+        f.duplicate_of = self
+        f.metadata = self.metadata
+        self.duplicates.append(f)
+
+    def detach_duplicates(self) -> None:
+        """Stop sharing the checking and cleaning with identical files."""
+        if self.duplicate_of:
+            self.duplicate_of.duplicates.remove(self)
+            self.duplicate_of = None
+        for duplicate in self.duplicates:
+            duplicate.duplicate_of = None
+        self.duplicates = []
+
+    def get_output_path(
+            self,
+            output_root: str,
+            path: Optional[str] = None) -> str:
+        """Get the path where to write the cleaned file in an output directory.
+
+        Args:
+            output_root (str): The output directory.
+            path (str, optional): Path of a hard link of the file. Defaults to
+                the path of the file.
+
+        Returns:
+            str: The path of the cleaned file, relative to the output
+                directory as the file is to its root.
+        """
+        path = path or self.path
+        relative_path = os.path.relpath(path, self.root)
+        if relative_path == os.pardir \
+                or relative_path.startswith(os.pardir + os.sep):
+            # Outside of the root, mirror the whole path
+            relative_path = path.lstrip(os.sep)
+        return os.path.join(output_root, relative_path)
 
     def _compute_temp_path(self, path: str) -> str:
         # We have to keep the extension so that ffmpeg doesn't break
         filename, extension = os.path.splitext(path)
         digest = hashlib.sha256(path.encode("utf-8")).hexdigest()
-        return os.path.join(tempfile.gettempdir(), f"{digest}{extension}")
+        temp_filename = f"{TEMP_FILE_PREFIX}{digest}{extension}"
+        # Write the cleaned file next to the original one, so that it can be
+        # renamed over it without copying it. Some directories can't be
+        # written to (e.g. Document portal), use the temporary directory then.
+        temp_path = os.path.join(os.path.dirname(path), temp_filename)
+        try:
+            os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT, 0o600))
+            os.remove(temp_path)
+        except OSError:
+            temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
+        return temp_path
 
     def _simplify_dir_path(self, path: str) -> str:
         dir_path = os.path.dirname(path)
@@ -145,28 +322,71 @@ class File(GObject.GObject):
             self.has_message = self.message_type != "none"
             self.emit("state-changed", state)
             return GLib.SOURCE_REMOVE
-        GLib.idle_add(update_state, state)
+        # Set first, for the handlers of dispatchers running them right away
         self.state = state
+        self._dispatcher.dispatch(update_state, state)
+        for duplicate in list(self.duplicates):
+            duplicate.error = self.error
+            duplicate._set_state(state)
+
+    def _measure(self, phase: str) -> ContextManager:
+        # Timings are only collected if the File Store asked for them
+        if self.timings is None:
+            return nullcontext()
+        return self.timings.measure(phase)
 
+    @traced
     def check_metadata(self) -> None:
         """Set up the parser and check the metadata present in the file."""
+        annotate(path=self.path)
         try:
-            parser, mimetype = parser_factory.get_parser(self.path)
+            with self._measure("get_parser"):
+                parser, mimetype = self._get_parser()
         except Exception as e:
             self._setup_parser_error(e)
         else:
+            if self.timings and mimetype:
+                self.timings.mimetype = mimetype
             self._setup_parser_finish(parser, mimetype)
 
-        if self.state != FileState.SUPPORTED:
+        parser = self._parser
+        if self.state != FileState.SUPPORTED or parser is None:
             return
         self._set_state(FileState.CHECKING_METADATA)
         try:
-            metadata = self._parser.get_meta()
+            with self._measure("get_meta"):
+                metadata = parser.get_meta()
+            if self.timings:
+                self.timings.bytes_read += self.size
         except Exception as e:
             self._check_metadata_error(e)
         else:
             self._check_metadata_finish(metadata)
 
+    def _get_parser(self):
+        return _create_parser(self._get_parser_function, self.path)
+
+    def mark_as_cleaned(self) -> None:
+        """Mark the file as already cleaned, without checking its metadata."""
+        self._set_state(FileState.CLEANED)
+
+    def invalidate(self) -> None:
+        """Forget the metadata found in the file, it has been modified.
+
+        The file stops sharing its checking and cleaning with identical files,
+        as their content may now differ. The metadata have to be checked again
+        with check_metadata().
+        """
+        self.detach_duplicates()
+        # Files detached from each other may still share their metadata
+        self.metadata = MetadataStore()
+        self.total_metadata = 0
+        self.error = None
+        self._parser = None
+        with suppress(OSError):
+            self.size = os.path.getsize(self.path)
+        self._set_state(FileState.INITIALIZING)
+
     def _setup_parser_error(self, error: Exception) -> None:
         self.error = error
         logger.warning(
@@ -175,17 +395,14 @@ class File(GObject.GObject):
 
     def _setup_parser_finish(self, parser, mimetype) -> None:
         self._parser = parser
-        # Disable sandbox in Flatpak, see
-        # https://github.com/flathub/fr.romainvigier.MetadataCleaner/pull/124
-        if Path("/.flatpak-info").exists():
-            self._parser.sandbox = False
         if mimetype:
             def update_mimetype(mimetype) -> bool:
-                self.mimetype = mimetype
-                self.icon_name = Gio.content_type_get_generic_icon_name(
-                    self.mimetype)
+                for f in [self, *self.duplicates]:
+                    f.mimetype = mimetype
+                    f.icon_name = Gio.content_type_get_generic_icon_name(
+                        mimetype)
                 return GLib.SOURCE_REMOVE
-            GLib.idle_add(update_mimetype, mimetype)
+            self._dispatcher.dispatch(update_mimetype, mimetype)
         if self._parser:
             self._set_state(FileState.SUPPORTED)
         else:
@@ -207,7 +424,15 @@ class File(GObject.GObject):
             for filename, file_metadata in metadata.items():
                 metadata_list = MetadataList()
                 for key, value in file_metadata.items():
-                    metadata_list.append(Metadata(key=key, value=value))
+                    metadata_list.append(Metadata(
+                        key=key,
+                        value=value,
+                        loader=partial(
+                            _load_metadata_value,
+                            self._get_parser_function,
+                            self.path,
+                            key,
+                            filename)))
                 self.metadata.append(MetadataFile(
                     filename=os.path.join(self.filename, filename),
                     metadata=metadata_list))
@@ -216,52 +441,174 @@ class File(GObject.GObject):
         else:
             metadata_list = MetadataList()
             for key, value in metadata.items():
-                metadata_list.append(Metadata(key=key, value=value))
+                metadata_list.append(Metadata(
+                    key=key,
+                    value=value,
+                    loader=partial(
+                        _load_metadata_value,
+                        self._get_parser_function,
+                        self.path,
+                        key)))
             self.metadata.append(MetadataFile(
                 filename=self.filename,
                 metadata=metadata_list))
             total_metadata += len(metadata_list)
 
         def update_total_metadata(total_metadata) -> bool:
-            self.total_metadata = total_metadata
+            for f in [self, *self.duplicates]:
+                f.total_metadata = total_metadata
             return GLib.SOURCE_REMOVE
-        GLib.idle_add(update_total_metadata, total_metadata)
+        self._dispatcher.dispatch(update_total_metadata, total_metadata)
         self._set_state(FileState.HAS_METADATA)
 
-    def clean(self, lightweight_mode=False) -> None:
+    def _drop_metadata_loaders(self) -> None:
+        for metadata_file in self.metadata:
+            for metadata in metadata_file.metadata:
+                metadata.drop_loader()
+
+    @traced
+    def clean(
+            self,
+            lightweight_mode=False,
+            output_root: Optional[str] = None,
+            mark_cleaned: bool = False) -> None:
         """Clean the metadata from the file.
 
         Args:
             lightweight_mode (bool, optional): Use mat2 lightweight mode to
                 preserve data integrity. Defaults to False.
+            output_root (str, optional): If set, the original file is kept
+                and the cleaned file is written in this directory, see
+                get_output_path(). Defaults to None.
+            mark_cleaned (bool, optional): Mark the cleaned file with an
+                extended attribute, so that it can be recognized as cleaned
+                when it is added again. Defaults to False.
         """
+        annotate(path=self.path)
         if self.state not in [
             FileState.HAS_METADATA,
             FileState.HAS_NO_METADATA
         ]:
             return
+        has_metadata = self.state == FileState.HAS_METADATA
         self._set_state(FileState.REMOVING_METADATA)
+        duplicates = list(self.duplicates)
+        duplicate_errors: Dict[File, Exception] = {}
+        temp_path: Optional[str] = None
         try:
-            self._parser.output_filename = self._temp_path
-            self._parser.lightweight_cleaning = lightweight_mode
-            result = self._parser.remove_all()
-            if result is False:
-                raise RuntimeError(_("An error occured during the cleaning."))
-            if not os.path.exists(self._temp_path):
-                raise RuntimeError(_(
-                    "Something bad happened during the cleaning, "
-                    "cleaned file not found"))
-            cleaned_gfile = Gio.File.new_for_path(self._temp_path)
-            cleaned_gfile.move(
-                self._gfile,
-                Gio.FileCopyFlags.OVERWRITE,
-                None,
-                None,
-                None)
+            cleaned_path = (
+                self.get_output_path(output_root) if output_root
+                else self.path)
+            if output_root and not has_metadata:
+                # Nothing to remove, share the data with the original file
+                with self._measure("clone"):
+                    clone_file(self.path, cleaned_path)
+            else:
+                if self._parser is None:
+                    # Duplicate of a file that has been removed from the store
+                    with self._measure("get_parser"):
+                        self._parser, mimetype = self._get_parser()
+                parser = self._parser
+                if parser is None:
+                    raise RuntimeError(_("The file is not supported."))
+                temp_path = self._compute_temp_path(cleaned_path)
+                parser.output_filename = temp_path
+                parser.lightweight_cleaning = lightweight_mode
+                with self._measure("remove_all"):
+                    result = parser.remove_all()
+                if self.timings:
+                    self.timings.bytes_read += self.size
+                if result is False:
+                    raise RuntimeError(
+                        _("An error occured during the cleaning."))
+                if not os.path.exists(temp_path):
+                    raise RuntimeError(_(
+                        "Something bad happened during the cleaning, "
+                        "cleaned file not found"))
+                with self._measure("move"):
+                    self._move_cleaned_file(temp_path, cleaned_path)
+                if self.timings:
+                    self.timings.bytes_written += self.bytes_written
+            if mark_cleaned:
+                self._mark_cleaned(cleaned_path)
+            self._link_hardlinks(cleaned_path, output_root)
+            for duplicate in duplicates:
+                try:
+                    duplicate_path = (
+                        duplicate.get_output_path(output_root) if output_root
+                        else duplicate.path)
+                    # Hard links would make the duplicates share their inode
+                    # in the original directories
+                    clone_file(
+                        cleaned_path,
+                        duplicate_path,
+                        hardlink=bool(output_root))
+                    if mark_cleaned:
+                        duplicate._mark_cleaned(duplicate_path)
+                    duplicate._link_hardlinks(duplicate_path, output_root)
+                except Exception as e:
+                    duplicate_errors[duplicate] = e
         except Exception as e:
+            if temp_path:
+                with suppress(OSError):
+                    os.remove(temp_path)
             self._clean_error(e)
         else:
+            if not output_root:
+                # The full values can't be read from the cleaned file
+                self._drop_metadata_loaders()
             self._clean_finish()
+            for duplicate, error in duplicate_errors.items():
+                duplicate._clean_error(error)
+
+    def _move_cleaned_file(self, temp_path: str, destination: str) -> None:
+        self.bytes_written = os.path.getsize(temp_path)
+        try:
+            shutil.copymode(self.path, temp_path)
+            os.replace(temp_path, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # The cleaned file had to be written on another filesystem. It is
+            # copied next to the destination, which is only replaced once the
+            # copy is complete.
+            fd, copy_path = tempfile.mkstemp(
+                prefix=TEMP_FILE_PREFIX,
+                suffix=".copy",
+                dir=os.path.dirname(destination) or None)
+            os.close(fd)
+            try:
+                copy_file(temp_path, copy_path, self._on_copy_progress)
+                shutil.copymode(self.path, copy_path)
+                os.replace(copy_path, destination)
+            finally:
+                with suppress(FileNotFoundError):
+                    os.remove(copy_path)
+            with suppress(OSError):
+                os.remove(temp_path)
+
+    def _mark_cleaned(self, cleaned_path: str) -> None:
+        try:
+            write_cleaned_marker(cleaned_path)
+        except Exception as e:
+            # Not all filesystems support extended attributes
+            logger.warning(
+                f"Unable to mark {self.filename} as cleaned: {e}")
+
+    def _on_copy_progress(self, copied: int, total: int) -> None:
+        self.bytes_written = copied
+
+    def _link_hardlinks(
+            self,
+            cleaned_path: str,
+            output_root: Optional[str] = None) -> None:
+        # Make the other hard links of the file point to the cleaned file
+        # instead of the original content
+        for hardlink in self.hardlinks:
+            destination = (
+                self.get_output_path(output_root, hardlink) if output_root
+                else hardlink)
+            link_file(cleaned_path, destination)
 
     def _clean_error(self, error: Exception) -> None:
         self.error = error
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Efficient file copy functions."""
+
+import errno
+import fcntl
+import os
+import secrets
+import shutil
+import tempfile
+
+from contextlib import suppress
+from typing import Callable, Optional
+
+# Prefix of the hidden temporary files written while cleaning
+TEMP_FILE_PREFIX = ".metadatacleaner-"
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Linux ioctl sharing the data of a file with another one
+_FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
+# Errors meaning that copy_file_range() can't be used between two files
+_COPY_FILE_RANGE_UNSUPPORTED_ERRORS = (
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+)
+
+
+def copy_file(
+        src_path: str,
+        dst_path: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+) -> None:
+    """Copy the content of a file over another file.
+
+    The copy is done in kernel space with copy_file_range() when possible, and
+    falls back to a regular read/write loop otherwise. The destination file is
+    overwritten in place, so it keeps its inode and permissions.
+
+    Args:
+        src_path (str): Path of the file to copy.
+        dst_path (str): Path of the file to overwrite.
+        progress_callback (Callable[[int, int], None], optional): Function
+            called after each copied chunk with the number of copied bytes
+            and the total number of bytes. Defaults to None.
+    """
+    with open(src_path, "rb", buffering=0) as src, \
+            open(dst_path, "wb", buffering=0) as dst:
+        total = os.fstat(src.fileno()).st_size
+        copied = 0
+        use_copy_file_range = hasattr(os, "copy_file_range")
+        while True:
+            if use_copy_file_range:
+                try:
+                    length = os.copy_file_range(
+                        src.fileno(), dst.fileno(), _CHUNK_SIZE)
+                except OSError as e:
+                    if e.errno not in _COPY_FILE_RANGE_UNSUPPORTED_ERRORS:
+                        raise
+                    use_copy_file_range = False
+                    continue
+            else:
+                chunk = src.read(_CHUNK_SIZE)
+                dst.write(chunk)
+                length = len(chunk)
+            if length == 0:
+                break
+            copied += length
+            if progress_callback:
+                progress_callback(copied, total)
+
+
+def clone_file(src_path: str, dst_path: str, hardlink: bool = True) -> None:
+    """Make a file with the same content as another file, sharing its data.
+
+    The data is shared with a reflink when the filesystem supports it, else
+    the file is hard linked if allowed, else it is copied.
+
+    The clone is made as a temporary file next to the destination, then
+    renamed over it. An existing destination is never written to: other hard
+    links to it keep their content, and it is left as it was on failure.
+
+    Args:
+        src_path (str): Path of the file to clone.
+        dst_path (str): Path of the clone, replaced if it exists.
+        hardlink (bool, optional): If the clone can be a hard link to the
+            file. Defaults to True.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix=TEMP_FILE_PREFIX,
+        suffix=".clone",
+        dir=os.path.dirname(dst_path) or None)
+    try:
+        with open(fd, "wb") as dst, open(src_path, "rb") as src:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        linked = False
+        if not cloned and hardlink:
+            try:
+                os.remove(temp_path)
+                os.link(src_path, temp_path)
+                linked = True
+            except OSError:
+                pass
+        if not cloned and not linked:
+            copy_file(src_path, temp_path)
+        if not linked:
+            shutil.copymode(src_path, temp_path)
+        os.replace(temp_path, dst_path)
+    finally:
+        # Left if the clone failed, or if the destination already was a hard
+        # link to the file, as renaming a hard link over another one of the
+        # same file does nothing
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
+
+
+def link_file(src_path: str, dst_path: str) -> None:
+    """Make a path a hard link to a file, replacing what it was.
+
+    The link is made with a unique temporary name next to the destination,
+    then renamed over it, so that the destination is replaced at once.
+
+    Args:
+        src_path (str): Path of the file to link to.
+        dst_path (str): Path of the link, replaced if it exists.
+    """
+    directory = os.path.dirname(dst_path)
+    for _ in range(tempfile.TMP_MAX):
+        temp_path = os.path.join(
+            directory, f"{TEMP_FILE_PREFIX}{secrets.token_hex(8)}.link")
+        try:
+            os.link(src_path, temp_path)
+            break
+        except FileExistsError:
+            continue
+    else:
+        raise FileExistsError(
+            errno.EEXIST, "No usable temporary name for a link", dst_path)
+    try:
+        os.replace(temp_path, dst_path)
+    finally:
+        # Left if the destination already was a hard link to the file
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
@@ -3,17 +3,44 @@
 
 """Files Manager object and states."""
 
+import asyncio
+import hashlib
 import libmat2
+import libmat2.abstract
 import mimetypes
+import os
+import time
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import Future
 from enum import IntEnum, auto
+from functools import partial
 from gi.repository import Gio, GLib, GObject
-from threading import Thread
-from typing import Dict, Iterable, List, Optional
+from threading import Condition, Lock, RLock
+from typing import \
+    Any, AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, \
+    Optional, Set, Tuple
 
-from metadatacleaner.modules.file import File, FileState
+from metadatacleaner.modules.directorymonitor import DirectoryMonitor
+from metadatacleaner.modules.dispatcher import \
+    DEFAULT_DISPATCHER, Dispatcher, GLibDispatcher
+from metadatacleaner.modules.file import \
+    CLEANED_MARKER_QUERY_ATTRIBUTES, File, FileState, GetParserFunction, \
+    has_valid_cleaned_marker
+from metadatacleaner.modules.journal import Journal, JournalEntries
 from metadatacleaner.modules.logger import Logger as logger
+from metadatacleaner.modules.memoryprofiler import \
+    MEMORY_PROFILE_ENVIRONMENT_VARIABLE, MemoryProfiler
+from metadatacleaner.modules.metadata import Metadata, MetadataList
+from metadatacleaner.modules.orchestrator import \
+    DEFAULT_ORCHESTRATOR, Orchestrator
+from metadatacleaner.modules.progress import Progress
+from metadatacleaner.modules.resultstream import FileResult, ResultStream
+from metadatacleaner.modules.scheduler import Scheduler
+from metadatacleaner.modules.throughput import ThroughputDatabase
+from metadatacleaner.modules.timings import \
+    TIMINGS_ENVIRONMENT_VARIABLE, TimingHistograms, Timings
+from metadatacleaner.modules.tracing import annotate, traced
 
 
 def _get_supported_formats() -> Dict:
@@ -32,6 +59,169 @@ def _get_supported_formats() -> Dict:
 
 SUPPORTED_FORMATS = _get_supported_formats()
 
+# Attributes queried for every file while gathering the files to add
+_FILE_ATTRIBUTES = ",".join((
+    Gio.FILE_ATTRIBUTE_STANDARD_TYPE,
+    Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
+    Gio.FILE_ATTRIBUTE_UNIX_DEVICE,
+    Gio.FILE_ATTRIBUTE_UNIX_INODE,
+    Gio.FILE_ATTRIBUTE_UNIX_NLINK,
+))
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Directory monitors are created, notified and released in the GLib main loop,
+# whatever the dispatcher of the File Store
+_MONITOR_DISPATCHER = GLibDispatcher()
+
+
+def _compute_digest(path: str) -> Optional[str]:
+    digest = hashlib.blake2b()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError as e:
+        logger.warning(f"Unable to compute the digest of {path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+class _GatheringContext:
+    """Context of the gathering of files to add.
+
+    It keeps track of the inodes already visited: directories to detect cycles
+    when following symbolic links, files only when they have multiple hard
+    links. It also keeps the roots of the added files, the directories
+    containing the files and folders that were explicitly added, and the
+    attributes to query for each file, and the sizes of the files.
+    """
+
+    def __init__(self, attributes: str = _FILE_ATTRIBUTES) -> None:
+        self.attributes = attributes
+        self._lock = Lock()
+        self._directories: Set[Tuple[int, int]] = set()
+        self._files: Dict[Tuple[int, int], str] = {}
+        self.hardlinks: Dict[str, List[str]] = {}
+        self.sizes: Dict[str, int] = {}
+        self.roots: List[Tuple[str, str]] = []
+
+    def add_root(self, gfile: Gio.File) -> None:
+        """Register a file or folder that was explicitly added."""
+        path = gfile.get_path()
+        self.roots.append((path, os.path.dirname(path)))
+
+    def get_root(self, path: str) -> str:
+        """Get the root of a gathered file.
+
+        Returns:
+            str: Directory containing the deepest added file or folder the
+                file is part of.
+        """
+        root = os.path.dirname(path)
+        longest_match = -1
+        for added_path, added_root in self.roots:
+            if (path == added_path or path.startswith(added_path + os.sep)) \
+                    and len(added_path) > longest_match:
+                root = added_root
+                longest_match = len(added_path)
+        return root
+
+    @staticmethod
+    def _get_inode(info: Gio.FileInfo) -> Optional[Tuple[int, int]]:
+        if not info.has_attribute(Gio.FILE_ATTRIBUTE_UNIX_INODE):
+            return None
+        return (
+            info.get_attribute_uint32(Gio.FILE_ATTRIBUTE_UNIX_DEVICE),
+            info.get_attribute_uint64(Gio.FILE_ATTRIBUTE_UNIX_INODE))
+
+    def visit_directory(self, info: Gio.FileInfo) -> bool:
+        """Mark a directory as visited.
+
+        Returns:
+            bool: False if the directory had already been visited.
+        """
+        inode = self._get_inode(info)
+        if inode is None:
+            return True
+        with self._lock:
+            if inode in self._directories:
+                return False
+            self._directories.add(inode)
+            return True
+
+    def visit_file(self, gfile: Gio.File, info: Gio.FileInfo) -> bool:
+        """Mark a file as visited.
+
+        Returns:
+            bool: False if the file is a hard link to a file already visited.
+        """
+        inode = self._get_inode(info)
+        if inode is None or info.get_attribute_uint32(
+                Gio.FILE_ATTRIBUTE_UNIX_NLINK) < 2:
+            return True
+        with self._lock:
+            first_path = self._files.get(inode)
+            if first_path is None:
+                self._files[inode] = gfile.get_path()
+                return True
+            if first_path != gfile.get_path():
+                self.hardlinks.setdefault(first_path, []).append(
+                    gfile.get_path())
+            return False
+
+
+class _AddRequest:
+    """Request to add files, see FileStore.add_gfiles().
+
+    A request is pending until its files have been gathered and all of them
+    have been added. Files added by a request asking for it are then cleaned.
+    """
+
+    def __init__(
+            self,
+            gfiles: List[Gio.File],
+            recursive: bool = True,
+            follow_symlinks: bool = True,
+            clean: bool = False,
+            output_root: Optional[str] = None,
+            stream: Optional[ResultStream] = None) -> None:
+        self.gfiles = gfiles
+        self.recursive = recursive
+        self.follow_symlinks = follow_symlinks
+        self.clean = clean
+        self.output_root = output_root
+        self.stream = stream
+        self.generation = 0
+        self.pending = 1
+        self.added_files: List[File] = []
+
+
+class _CleaningJob:
+    """Cleaning job, see FileStore.clean_files().
+
+    Several jobs can run at the same time, for instance one per batch of
+    files in watch mode. Each job keeps track of what it added to the
+    progress and to the estimates of the File Store, so that it can take back
+    what it didn't do when it ends.
+    """
+
+    def __init__(
+            self,
+            output_root: Optional[str] = None,
+            files: Optional[List[File]] = None,
+            stream: Optional[ResultStream] = None) -> None:
+        self.output_root = output_root
+        self.files = files
+        self.stream = stream
+        self.future: Optional[Future] = None
+        # Set when the job starts running, or ends without having run
+        self.started = False
+        self.ended = False
+        self.files_left = 0
+        self.size_left = 0
+        self.estimate_left = 0.0
+
 
 class FileStoreState(IntEnum):
     """States the Files Manager can have."""
@@ -55,46 +245,287 @@ class FileStore(Gio.ListStore):
     __gsignals__ = {
         "file-state-changed": (GObject.SIGNAL_RUN_LAST, None, (int,)),
         "state-changed": (GObject.SIGNAL_RUN_LAST, None, (int,)),
-        "progress-changed": (GObject.SIGNAL_RUN_LAST, None, (int, int))
+        "progress-changed": (
+            GObject.SIGNAL_RUN_LAST,
+            None,
+            (int, int, int, GObject.TYPE_INT64, GObject.TYPE_INT64))
     }
 
     lightweight_mode: bool = GObject.Property(
         type=bool,
         nick="lightweight-mode",
         default=False)
+    deduplicate: bool = GObject.Property(type=bool, default=False)
+    mark_cleaned_files: bool = GObject.Property(
+        type=bool,
+        nick="mark-cleaned-files",
+        default=False)
+    monitor_files: bool = GObject.Property(
+        type=bool,
+        nick="monitor-files",
+        default=False)
+
+    def __init__(
+            self,
+            scheduler: Optional[Scheduler] = None,
+            throughput: Optional[ThroughputDatabase] = None,
+            get_parser: Optional[GetParserFunction] = None,
+            dispatcher: Optional[Dispatcher] = None,
+            orchestrator: Optional[Orchestrator] = None) -> None:
+        """File Store initialization.
 
-    def __init__(self) -> None:
-        """File Store initialization."""
+        Args:
+            scheduler (Scheduler, optional): Scheduler running the tasks of the
+                File Store, shared with other File Stores. Defaults to a
+                scheduler of its own.
+            throughput (ThroughputDatabase, optional): Database recording the
+                durations of the cleanings, to estimate the duration of the
+                next ones. Defaults to None.
+            get_parser (GetParserFunction, optional): Function returning the
+                parser handling a file and its mimetype. Defaults to the
+                parsers of libmat2.
+            dispatcher (Dispatcher, optional): Dispatcher running the updates
+                of the list of files and the emissions of the signals, of the
+                File Store and of its files. Defaults to the GLib main loop.
+            orchestrator (Orchestrator, optional): Orchestrator running the
+                adding and cleaning jobs, shared with other File Stores.
+                Defaults to a shared orchestrator with a control thread of its
+                own.
+        """
         Gio.ListStore.__init__(self, item_type=File)
+        self._get_parser = get_parser
+        self._dispatcher = dispatcher or DEFAULT_DISPATCHER
+        self._orchestrator = orchestrator or DEFAULT_ORCHESTRATOR
         self.state = FileStoreState.IDLE
+        # The File Store is working while it is adding or cleaning files, the
+        # flags being set under the lock of each action
+        self._state_lock = RLock()
+        self._adding = False
+        self._cleaning = False
         self.last_action: Optional[FileStoreAction] = None
-        self.progress = (0, 0)
-        self.add_files_executor = ThreadPoolExecutor()
-        self.clean_files_executor = ThreadPoolExecutor()
+        self._adding_progress = Progress(
+            partial(self._publish_progress, FileStoreAction.ADDING))
+        self._cleaning_progress = Progress(
+            partial(self._publish_progress, FileStoreAction.CLEANING))
+        self._scheduler = scheduler or Scheduler()
+        self._scheduler_client = self._scheduler.create_client()
+        self._throughput = throughput
+        # Estimated durations of the files being cleaned, for the remaining
+        # time of the cleaning
+        self._estimates_lock = Lock()
+        self._cleaning_start_time: Optional[float] = None
+        self._estimated_total = 0.0
+        self._estimated_done = 0.0
+        self._timings: Optional[TimingHistograms] = None
+        self.timings_path: Optional[str] = None
+        if os.environ.get(TIMINGS_ENVIRONMENT_VARIABLE):
+            self.enable_timings(os.environ[TIMINGS_ENVIRONMENT_VARIABLE])
+        self._memory_profiler: Optional[MemoryProfiler] = None
+        self.memory_profile_path: Optional[str] = None
+        if os.environ.get(MEMORY_PROFILE_ENVIRONMENT_VARIABLE):
+            self.enable_memory_profiling(
+                os.environ[MEMORY_PROFILE_ENVIRONMENT_VARIABLE])
+        # Requests to add files, processed by a single job. Adding work is
+        # pending while requests are queued or their files are being added.
+        self._add_condition = Condition()
+        self._add_requests: Deque[_AddRequest] = deque()
+        self._add_job: Optional[Future] = None
+        self._add_generation = 0
+        self._pending_adds = 0
+        self._paths: Set[str] = set()
+        # Files of the store by path, updated along with the store
+        self._files_by_path: Dict[str, File] = {}
+        self._futures_lock = Lock()
+        self._futures: Dict[FileStoreAction, List[Future]] = {
+            FileStoreAction.ADDING: [],
+            FileStoreAction.CLEANING: [],
+        }
+        self._cleaning_jobs: List[_CleaningJob] = []
+        self.interrupted_paths: List[str] = []
+        self._journal: Optional[Journal] = None
+        self._journal_entries = JournalEntries({})
+        self._monitors: List[DirectoryMonitor] = []
+        self._watched_paths: Set[str] = set()
+        self._watch_output_root: Optional[str] = None
+        self._cleaned_stats: Dict[str, Tuple[int, int]] = {}
+        self._file_monitors: Dict[str, DirectoryMonitor] = {}
+        # Paths of the files of the store by directory
+        self._files_by_directory: Dict[str, Set[str]] = {}
+        self.connect("notify::monitor-files", self._on_monitor_files_changed)
+
+    @GObject.Property(type=int, default=0)
+    def priority(self) -> int:
+        """Priority of the tasks over the ones of other File Stores."""
+        return self._scheduler_client.priority
+
+    @priority.setter  # type: ignore
+    def priority(self, priority: int) -> None:
+        self._scheduler_client.priority = priority
+
+    @GObject.Property(type=bool, default=False)
+    def paused(self) -> bool:
+        """Whether the tasks are kept from being run."""
+        return self._scheduler_client.paused
+
+    @paused.setter  # type: ignore
+    def paused(self, paused: bool) -> None:
+        self._scheduler_client.paused = paused
+
+    def _submit(
+            self,
+            action: FileStoreAction,
+            fn: Callable,
+            *args) -> Future:
+        future = self._scheduler_client.submit(fn, *args)
+        with self._futures_lock:
+            self._futures[action].append(future)
+        return future
+
+    def _cancel_futures(self, action: FileStoreAction) -> None:
+        with self._futures_lock:
+            futures, self._futures[action] = self._futures[action], []
+        for future in futures:
+            future.cancel()
 
     def _on_file_state_changed(self, f: File, new_state: FileState) -> None:
         def emit() -> bool:
             self.emit("file-state-changed", self.get_index_of_file(f))
             return GLib.SOURCE_REMOVE
-        GLib.idle_add(emit)
+        self._dispatcher.dispatch(emit)
 
-    def _set_state(self, state: FileStoreState) -> None:
-        if state == self.state:
-            return
-        self.state = state
+    def _update_state(self) -> None:
+        """Update the state from the actions running."""
+        with self._state_lock:
+            state = FileStoreState.WORKING if self._adding or self._cleaning \
+                else FileStoreState.IDLE
+            if state == self.state:
+                return
+            self.state = state
+
+            def emit() -> bool:
+                self.emit("state-changed", state)
+                return GLib.SOURCE_REMOVE
+            # Dispatched under the lock, so that the changes are emitted in
+            # the order they were made
+            self._dispatcher.dispatch(emit)
 
+    def _publish_progress(
+            self,
+            action: FileStoreAction,
+            current: int,
+            total: int,
+            bytes_done: int,
+            bytes_total: int) -> None:
         def emit() -> bool:
-            self.emit("state-changed", state)
+            self.emit(
+                "progress-changed",
+                action,
+                current,
+                total,
+                bytes_done,
+                bytes_total)
             return GLib.SOURCE_REMOVE
-        GLib.idle_add(emit)
+        self._dispatcher.dispatch(emit)
 
-    def _set_progress(self, current: int, total: int) -> None:
-        self.progress = (current, total)
+    def open_journal(self, path: str) -> None:
+        """Record the cleaning of the files in a journal.
 
-        def emit() -> bool:
-            self.emit("progress-changed", current, total)
-            return GLib.SOURCE_REMOVE
-        GLib.idle_add(emit)
+        If the journal already exists, files it records as cleaned and that
+        haven't been modified since are marked as cleaned when they are added,
+        without being checked again. Files that were being cleaned when the
+        journal was last written to are listed in interrupted_paths. Only the
+        files cleaned in place are recorded.
+
+        Args:
+            path (str): Path of the journal file.
+        """
+        self.close_journal()
+        self._journal_entries = Journal.replay(path)
+        self.interrupted_paths = self._journal_entries.get_paths(
+            FileState.REMOVING_METADATA)
+        if self.interrupted_paths:
+            logger.warning(
+                f"{len(self.interrupted_paths)} files were being cleaned when "
+                f"the journal {path} was interrupted:\n"
+                + "\n".join(self.interrupted_paths))
+        self._journal = Journal(path)
+
+    def close_journal(self) -> None:
+        """Stop recording the cleaning of the files in a journal."""
+        if self._journal:
+            self._journal.close()
+        self._journal = None
+        self._journal_entries = JournalEntries({})
+
+    def _is_cleaned_in_journal(self, f: File) -> bool:
+        entry = self._journal_entries.get(f.path)
+        if not entry or entry.state != FileState.CLEANED:
+            return False
+        try:
+            stat = os.stat(f.path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (entry.size, entry.mtime_ns)
+
+    def enable_timings(self, path: Optional[str] = None) -> None:
+        """Collect the timings of the phases of the processing of the files.
+
+        Only the files added afterwards are timed.
+
+        Args:
+            path (str, optional): Path of a JSON file to dump the timings to
+                at the end of each cleaning. Defaults to None.
+        """
+        self._timings = TimingHistograms()
+        self.timings_path = path
+
+    def get_timings(self) -> Optional[TimingHistograms]:
+        """Get the timings of the phases of the processing of the files.
+
+        Returns:
+            Optional[TimingHistograms]: The timings, or None if they are not
+                collected.
+        """
+        return self._timings
+
+    def enable_memory_profiling(
+            self,
+            path: Optional[str] = None,
+            interval: int = 1000) -> None:
+        """Profile the memory used while adding and cleaning the files.
+
+        Args:
+            path (str, optional): Path of a JSON file to dump the profile to
+                at the end of each adding and cleaning. Defaults to None.
+            interval (int, optional): Number of files added or cleaned between
+                two snapshots of the memory. Defaults to 1000.
+        """
+        self._memory_profiler = MemoryProfiler({
+            "File": File,
+            "Metadata": Metadata,
+            "MetadataList": MetadataList,
+            "parser": libmat2.abstract.AbstractParser,
+        }, interval)
+        self.memory_profile_path = path
+
+    def get_memory_profiler(self) -> Optional[MemoryProfiler]:
+        """Get the profiler of the memory used by the processing of the files.
+
+        Returns:
+            Optional[MemoryProfiler]: The profiler, or None if the memory is
+                not profiled.
+        """
+        return self._memory_profiler
+
+    def _dump_memory_profile(self) -> None:
+        if not self._memory_profiler or not self.memory_profile_path:
+            return
+        try:
+            self._memory_profiler.dump(self.memory_profile_path)
+        except OSError as e:
+            logger.warning(
+                "Unable to write the memory profile to "
+                f"{self.memory_profile_path}: {e}")
 
     def get_files(self) -> List[File]:
         """Get all the files from the File Store.
@@ -133,112 +564,670 @@ class FileStore(Gio.ListStore):
         return position
 
     def add_gfiles(
-            self, gfiles: List[Gio.File], recursive: bool = True) -> None:
+            self,
+            gfiles: List[Gio.File],
+            recursive: bool = True,
+            follow_symlinks: bool = True) -> None:
         """Add Gio Files to the Files Manager.
 
+        Hard links to the same file are only added once. The directories of
+        the added files are then monitored, so that files modified before being
+        cleaned are checked again and deleted files are removed.
+
         Args:
             gfiles (List[Gio.File]): List of Gio Files to add.
             recursive (bool, optional): If subdirectories should also be looked
             into. Defaults to True.
+            follow_symlinks (bool, optional): If symbolic links found in
+            directories should be followed. Defaults to True.
+        """
+        self._queue_add_request(
+            _AddRequest(gfiles, recursive, follow_symlinks))
+
+    def iter_add(
+            self,
+            paths: Iterable[str],
+            recursive: bool = True,
+            follow_symlinks: bool = True,
+            max_pending: int = 64) -> Iterator[FileResult]:
+        """Add files, and get their results as soon as they are added.
+
+        The files are added when the iteration starts, as with add_gfiles().
+        The workers wait while max_pending results are waiting to be consumed,
+        and stop waiting once the iteration is stopped.
+
+        Args:
+            paths (Iterable[str]): Paths of the files and folders to add.
+            recursive (bool, optional): If subdirectories should also be looked
+            into. Defaults to True.
+            follow_symlinks (bool, optional): If symbolic links found in
+            directories should be followed. Defaults to True.
+            max_pending (int, optional): Maximum number of results waiting to
+                be consumed. Defaults to 64.
+
+        Yields:
+            FileResult: Results of the added files, in the order they are
+                added.
+        """
+        stream = ResultStream(max_pending)
+        self._queue_add_request(_AddRequest(
+            [Gio.File.new_for_path(path) for path in paths],
+            recursive,
+            follow_symlinks,
+            stream=stream))
+        yield from stream
+
+    async def aiter_add(
+            self,
+            paths: Iterable[str],
+            recursive: bool = True,
+            follow_symlinks: bool = True,
+            max_pending: int = 64) -> AsyncIterator[FileResult]:
+        """Add files, and get their results as soon as they are added.
+
+        Asynchronous version of iter_add(), waiting for the results in the
+        running event loop without blocking a thread.
+
+        Args:
+            paths (Iterable[str]): Paths of the files and folders to add.
+            recursive (bool, optional): If subdirectories should also be looked
+            into. Defaults to True.
+            follow_symlinks (bool, optional): If symbolic links found in
+            directories should be followed. Defaults to True.
+            max_pending (int, optional): Maximum number of results waiting to
+                be consumed. Defaults to 64.
+
+        Yields:
+            FileResult: Results of the added files, in the order they are
+                added.
+        """
+        stream = ResultStream(max_pending)
+        self._queue_add_request(_AddRequest(
+            [Gio.File.new_for_path(path) for path in paths],
+            recursive,
+            follow_symlinks,
+            stream=stream))
+        async for result in self._aiter_stream(stream):
+            yield result
+
+    @staticmethod
+    async def _aiter_stream(
+            stream: ResultStream) -> AsyncIterator[FileResult]:
+        try:
+            while (result := await stream.get_async()) is not None:
+                yield result
+        finally:
+            stream.close()
+
+    def watch_gfiles(
+            self,
+            gfiles: List[Gio.File],
+            output_root: Optional[str] = None,
+            settle_delay: int = 2000) -> None:
+        """Add folders and clean the files written to them afterwards.
+
+        The folders and their subfolders are monitored. Files created or
+        modified in them are added and cleaned once they haven't been written
+        to for a while. The files already present are added and cleaned as
+        well. A GLib main loop has to run for the changes to be noticed.
+
+        Args:
+            gfiles (List[Gio.File]): List of folders to watch.
+            output_root (str, optional): If set, the cleaned files are written
+                in this directory, see clean_files(). Defaults to None.
+            settle_delay (int, optional): Delay in milliseconds without
+                writes after which a file is added. Defaults to 2000.
+        """
+        self._watch_output_root = output_root
+        for gfile in gfiles:
+            monitor = DirectoryMonitor(
+                gfile, recursive=True, settle_delay=settle_delay)
+            monitor.connect("files-changed", self._on_watched_files_changed)
+            monitor.connect("files-deleted", self._on_files_deleted)
+            self._monitors.append(monitor)
+            self._watched_paths.add(gfile.get_path())
+        self._queue_add_request(
+            _AddRequest(gfiles, clean=True, output_root=output_root))
+
+    def stop_watching(self) -> None:
+        """Stop watching the folders given to watch_gfiles()."""
+        for monitor in self._monitors:
+            monitor.stop()
+        self._monitors = []
+        self._watched_paths = set()
+        self._cleaned_stats = {}
+
+    def _on_watched_files_changed(
+            self,
+            monitor: DirectoryMonitor,
+            gfiles: List[Gio.File]) -> None:
+        output_root = self._watch_output_root
+        changed_gfiles = []
+        for gfile in gfiles:
+            path = gfile.get_path()
+            if output_root and (
+                    path == output_root
+                    or path.startswith(output_root + os.sep)):
+                continue
+            f = self._files_by_path.get(path)
+            if f is None:
+                changed_gfiles.append(gfile)
+                continue
+            if f.state in (
+                    FileState.INITIALIZING,
+                    FileState.CHECKING_METADATA,
+                    FileState.REMOVING_METADATA):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self._cleaned_stats.get(path) == \
+                    (stat.st_size, stat.st_mtime_ns):
+                # Written by the cleaning itself
+                continue
+            # Removing it also detaches it from its identical files, its
+            # content may not be identical to theirs anymore
+            self.remove_file(f)
+            changed_gfiles.append(gfile)
+        if not changed_gfiles:
+            return
+        self._queue_add_request(
+            _AddRequest(changed_gfiles, clean=True, output_root=output_root))
+
+    def _is_watched(self, path: str) -> bool:
+        directory = os.path.dirname(path)
+        while directory not in self._watched_paths:
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return False
+            directory = parent
+        return True
+
+    def _on_monitor_files_changed(
+            self,
+            file_store: "FileStore",
+            pspec: GObject.ParamSpec) -> None:
+        if not self.monitor_files:
+            _MONITOR_DISPATCHER.dispatch(self._unmonitor_files)
+
+    def _monitor_file(self, f: File) -> None:
+        """Monitor the directory of a file to notice its modifications.
+
+        Only run by the monitor dispatcher.
+        """
+        directory = os.path.dirname(f.path)
+        paths = self._files_by_directory.setdefault(directory, set())
+        paths.add(f.path)
+        if len(paths) > 1:
+            return
+        monitor = DirectoryMonitor(Gio.File.new_for_path(directory))
+        monitor.connect("files-changed", self._on_files_changed)
+        monitor.connect("files-deleted", self._on_files_deleted)
+        self._file_monitors[directory] = monitor
+
+    def _unmonitor_file(self, f: File) -> None:
+        directory = os.path.dirname(f.path)
+        paths = self._files_by_directory.get(directory, set())
+        paths.discard(f.path)
+        if paths:
+            return
+        self._files_by_directory.pop(directory, None)
+        monitor = self._file_monitors.pop(directory, None)
+        if monitor:
+            monitor.stop()
+
+    def _unmonitor_files(self) -> None:
+        for monitor in self._file_monitors.values():
+            monitor.stop()
+        self._file_monitors = {}
+        self._files_by_directory = {}
+
+    def _on_files_changed(
+            self,
+            monitor: DirectoryMonitor,
+            gfiles: List[Gio.File]) -> None:
+        for gfile in gfiles:
+            f = self._files_by_path.get(gfile.get_path())
+            # Files in watched folders are added again by the watch mode
+            if f is None or self._is_watched(f.path):
+                continue
+            # Cleaned files are rewritten by the cleaning itself
+            if f.state not in (
+                    FileState.HAS_METADATA,
+                    FileState.HAS_NO_METADATA,
+                    FileState.ERROR_WHILE_CHECKING_METADATA):
+                continue
+            logger.info(f"{f.path} has been modified, checking it again.")
+            f.invalidate()
+            self._submit(FileStoreAction.ADDING, f.check_metadata)
+
+    def _on_files_deleted(
+            self,
+            monitor: DirectoryMonitor,
+            gfiles: List[Gio.File]) -> None:
+        deleted_paths = set()
+        for gfile in gfiles:
+            path = gfile.get_path()
+            if path in self._files_by_path:
+                deleted_paths.add(path)
+            # A deleted folder takes the files of its subfolders with it
+            for directory, paths in self._files_by_directory.items():
+                if directory == path or directory.startswith(path + os.sep):
+                    deleted_paths.update(paths)
+        deleted_files = [
+            f for f in map(self._files_by_path.get, deleted_paths)
+            if f is not None
+            and f.state != FileState.REMOVING_METADATA
+            # It could have been replaced in the meantime
+            and not os.path.lexists(f.path)
+        ]
+        for f in deleted_files:
+            logger.info(f"{f.path} has been deleted, removing it.")
+            self.remove_file(f)
+
+    def _queue_add_request(self, request: _AddRequest) -> None:
+        """Queue a request to add files.
+
+        Requests are processed one after the other by a job of the
+        orchestrator, which ends once there are no requests left. The requests
+        queued while files are being gathered are merged, so that files found
+        by several of them are only added once.
+        """
+        with self._add_condition:
+            request.generation = self._add_generation
+            self._add_requests.append(request)
+            self._pending_adds += 1
+            self._adding = True
+            if self._add_job is None:
+                self._add_job = self._orchestrator.submit(
+                    self._process_add_requests)
+        self._update_state()
+
+    async def _process_add_requests(self) -> None:
+        while True:
+            with self._add_condition:
+                if not self._add_requests:
+                    # Started again by the next request
+                    self._add_job = None
+                    return
+                requests = list(self._add_requests)
+                self._add_requests.clear()
+            await self._add_gfiles_async(requests)
+
+    async def _run_adding_task(self, fn: Callable, *args) -> Any:
+        """Run a task in the scheduler and wait for its result.
+
+        Returns:
+            Any: The result of the task, or None if it has been cancelled.
+        """
+        future = asyncio.wrap_future(
+            self._submit(FileStoreAction.ADDING, fn, *args))
+        # Unlike awaiting the future, doesn't raise if it is cancelled
+        await asyncio.wait([future])
+        return None if future.cancelled() else future.result()
+
+    async def _add_gfiles_async(self, requests: List[_AddRequest]) -> None:
+        """Add the files of requests, in the event loop of the orchestrator.
+
+        The files are gathered, grouped and added by the scheduler, and the
+        requests are then only pending on the files being added.
         """
-        thread = Thread(
-            target=self._add_gfiles_async,
-            args=(gfiles, recursive),
-            daemon=True)
-        thread.start()
-
-    def _add_gfiles_async(
-            self, gfiles: List[Gio.File], recursive: bool = True) -> None:
-        self._set_state(FileStoreState.WORKING)
-        all_gfiles = self._gather_all_gfiles(gfiles, recursive)
-        self._set_progress(
-            self.progress[0], self.progress[1] + len(all_gfiles))
         self.last_action = FileStoreAction.ADDING
-        futures = {
-            self.add_files_executor.submit(self._add_gfile, gfile)
-            for gfile in all_gfiles
-        }
-        for future in as_completed(futures):
-            current = self.progress[0] + 1
-            total = self.progress[1]
-            self._set_progress(current, total)
-            if current == total:
-                self._stop_adding_gfiles()
-
-    def _gather_all_gfiles(
+        context = _GatheringContext(
+            f"{_FILE_ATTRIBUTES},{CLEANED_MARKER_QUERY_ATTRIBUTES}"
+            if self.mark_cleaned_files else _FILE_ATTRIBUTES)
+        all_gfiles: List[Tuple[Gio.File, Gio.FileInfo]] = []
+        requests_by_path: Dict[str, _AddRequest] = {}
+        sizes = context.sizes
+        for request in requests:
+            start_time = time.monotonic()
+            try:
+                gfiles = await self._gather_all_gfiles(
+                    request.gfiles,
+                    request.recursive,
+                    request.follow_symlinks,
+                    context)
+            except Exception as e:
+                logger.warning(f"Unable to gather the files to add: {e}")
+                continue
+            if self._timings:
+                self._timings.add_duration(
+                    "enumerate", time.monotonic() - start_time)
+            for gfile, info in gfiles:
+                path = gfile.get_path()
+                # Already found by another request
+                if path in requests_by_path:
+                    continue
+                requests_by_path[path] = request
+                sizes[path] = info.get_size()
+                all_gfiles.append((gfile, info))
+        with self._add_condition:
+            cancelled = any(
+                request.generation != self._add_generation
+                for request in requests)
+        if cancelled:
+            all_gfiles = []
+        self._adding_progress.add(
+            len(all_gfiles),
+            sum(sizes[gfile.get_path()] for gfile, info in all_gfiles))
+        marked_gfiles: List[Gio.File] = []
+        if self.mark_cleaned_files:
+            unmarked_gfiles = []
+            for gfile, info in all_gfiles:
+                if has_valid_cleaned_marker(info):
+                    marked_gfiles.append(gfile)
+                else:
+                    unmarked_gfiles.append((gfile, info))
+            all_gfiles = unmarked_gfiles
+        if self.deduplicate:
+            groups = await self._group_identical_gfiles(all_gfiles)
+        else:
+            groups = [[gfile] for gfile, info in all_gfiles]
+        tasks = [(group, False) for group in groups]
+        # Files already cleaned don't need to be parsed
+        tasks.extend(([gfile], True) for gfile in marked_gfiles)
+        for group, cleaned in tasks:
+            request = requests_by_path[group[0].get_path()]
+            with self._add_condition:
+                request.pending += 1
+                self._pending_adds += 1
+            future = self._submit(
+                FileStoreAction.ADDING,
+                self._add_gfile,
+                group[0],
+                group[1:],
+                context,
+                cleaned)
+            future.add_done_callback(partial(
+                self._on_gfile_added,
+                request,
+                len(group),
+                sum(sizes[gfile.get_path()] for gfile in group)))
+        # The requests are now only pending on the files being added
+        for request in requests:
+            self._finish_add_request(request)
+
+    def _on_gfile_added(
+            self,
+            request: _AddRequest,
+            files: int,
+            size: int,
+            future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            added_files = future.result()
+            with self._add_condition:
+                request.added_files.extend(added_files)
+            if request.stream:
+                # Waits for the consumer, so that the workers don't run ahead
+                for added_file in added_files:
+                    request.stream.put(added_file)
+        self._adding_progress.advance(files, size)
+        self._finish_add_request(request)
+
+    def _finish_add_request(self, request: _AddRequest) -> None:
+        with self._add_condition:
+            request.pending -= 1
+            self._pending_adds -= 1
+            request_done = request.pending == 0
+            cancelled = request.generation != self._add_generation
+            adding_done = self._pending_adds == 0
+            if adding_done:
+                self._adding = False
+        if request_done and request.stream:
+            request.stream.finish()
+        if request_done and request.clean and request.added_files \
+                and not cancelled:
+            self._start_cleaning(request.output_root, request.added_files)
+        if adding_done:
+            self._stop_adding_gfiles()
+
+    async def _gather_all_gfiles(
             self,
             gfiles: List[Gio.File],
-            recursive: bool = True) -> List[Gio.File]:
-        all_gfiles: List[Gio.File] = []
+            recursive: bool,
+            follow_symlinks: bool,
+            context: _GatheringContext) -> List[Tuple[Gio.File, Gio.FileInfo]]:
+        all_gfiles: List[Tuple[Gio.File, Gio.FileInfo]] = []
         for gfile in gfiles:
             if not gfile:
                 continue
-            f_type = gfile.query_file_type(Gio.FileQueryInfoFlags.NONE, None)
+            context.add_root(gfile)
+            info = await self._run_adding_task(
+                self._query_gfile, gfile, context)
+            if info is None:
+                continue
+            f_type = info.get_file_type()
             if f_type == Gio.FileType.DIRECTORY:
-                all_gfiles.extend(self._get_gfiles_from_dir(gfile, recursive))
+                if context.visit_directory(info):
+                    all_gfiles.extend(await self._walk_directory(
+                        gfile, recursive, follow_symlinks, context))
             elif f_type == Gio.FileType.REGULAR:
-                all_gfiles.append(gfile)
+                if context.visit_file(gfile, info):
+                    all_gfiles.append((gfile, info))
             else:
                 logger.warning(
                     f"File {gfile.get_path()} is neither a directory nor a "
                     "regular file, skipping.")
         return all_gfiles
 
-    def _get_gfiles_from_dir(
-            self, dir: Gio.File, recursive: bool) -> List[Gio.File]:
-        gfiles: List[Gio.File] = []
-        subdirs: List[Gio.File] = []
-        children_enumerator = dir.enumerate_children(
-            "",
-            Gio.FileQueryInfoFlags.NONE,
-            None)
-        while True:
-            info = children_enumerator.next_file(None)
-            if info is None:
-                break
-            child = children_enumerator.get_child(info)
-            if info.get_file_type() == Gio.FileType.DIRECTORY:
-                if recursive:
-                    subdirs.append(child)
-            elif info.get_file_type() == Gio.FileType.REGULAR:
-                gfiles.append(child)
-        children_enumerator.close(None)
-        with ThreadPoolExecutor() as executor:
-            for subgfiles in executor.map(
-                    self._get_gfiles_from_dir,
-                    subdirs,
-                    [recursive] * len(subdirs)):
-                gfiles.extend(subgfiles)
+    @staticmethod
+    def _query_gfile(
+            gfile: Gio.File,
+            context: _GatheringContext) -> Optional[Gio.FileInfo]:
+        # Files given explicitly are always resolved
+        try:
+            return gfile.query_info(
+                context.attributes,
+                Gio.FileQueryInfoFlags.NONE,
+                None)
+        except GLib.Error as e:
+            # Missing files and dangling links only skip themselves
+            logger.warning(
+                f"Unable to query {gfile.get_path()}, skipping: {e.message}")
+            return None
+
+    async def _walk_directory(
+            self,
+            dir: Gio.File,
+            recursive: bool,
+            follow_symlinks: bool,
+            context: _GatheringContext) -> List[Tuple[Gio.File, Gio.FileInfo]]:
+        """List the files in a directory and its subdirectories.
+
+        Each directory is listed by a task of its own, submitted once its
+        parent has been listed, so that no task waits for another one.
+        """
+        gfiles: List[Tuple[Gio.File, Gio.FileInfo]] = []
+
+        def list_directory(dir: Gio.File) -> asyncio.Future:
+            return asyncio.wrap_future(self._submit(
+                FileStoreAction.ADDING,
+                self._list_directory,
+                dir, recursive, follow_symlinks, context))
+
+        pending = {list_directory(dir)}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                dir_gfiles, subdirs = future.result()
+                gfiles.extend(dir_gfiles)
+                pending.update(map(list_directory, subdirs))
         return gfiles
 
-    def _add_gfile(self, gfile: Gio.File) -> None:
+    @traced
+    def _list_directory(
+            self,
+            dir: Gio.File,
+            recursive: bool,
+            follow_symlinks: bool,
+            context: _GatheringContext
+    ) -> Tuple[List[Tuple[Gio.File, Gio.FileInfo]], List[Gio.File]]:
+        gfiles: List[Tuple[Gio.File, Gio.FileInfo]] = []
+        subdirs: List[Gio.File] = []
+        annotate(path=dir.get_path())
+        try:
+            children_enumerator = dir.enumerate_children(
+                context.attributes,
+                Gio.FileQueryInfoFlags.NONE if follow_symlinks
+                else Gio.FileQueryInfoFlags.NOFOLLOW_SYMLINKS,
+                None)
+            while True:
+                info = children_enumerator.next_file(None)
+                if info is None:
+                    break
+                child = children_enumerator.get_child(info)
+                if info.get_file_type() == Gio.FileType.DIRECTORY:
+                    if recursive and context.visit_directory(info):
+                        subdirs.append(child)
+                elif info.get_file_type() == Gio.FileType.REGULAR:
+                    if context.visit_file(child, info):
+                        gfiles.append((child, info))
+            children_enumerator.close(None)
+        except GLib.Error as e:
+            # Only skips the rest of this directory
+            logger.warning(
+                f"Unable to list {dir.get_path()}, skipping it: {e.message}")
+        return gfiles, subdirs
+
+    async def _group_identical_gfiles(
+            self,
+            gfiles: List[Tuple[Gio.File, Gio.FileInfo]]
+    ) -> List[List[Gio.File]]:
+        """Group files having the same content and extension.
+
+        The parser handling a file depends on its extension, so identical files
+        with different extensions are not grouped. Files are first grouped by
+        size and extension, so that only files sharing them with another one
+        have to be read to compute their digest.
+        """
+        keys: Dict[Tuple[int, str], List[Gio.File]] = {}
+        for gfile, info in gfiles:
+            extension = os.path.splitext(gfile.get_path())[1].lower()
+            keys.setdefault((info.get_size(), extension), []).append(gfile)
+        groups: List[List[Gio.File]] = []
+        candidates: List[Tuple[Tuple[int, str], Gio.File]] = []
+        for key, same_key_gfiles in keys.items():
+            if len(same_key_gfiles) == 1:
+                groups.append(same_key_gfiles)
+            else:
+                candidates.extend((key, gfile) for gfile in same_key_gfiles)
+        digests: Dict[Tuple[Tuple[int, str], str], List[Gio.File]] = {}
+        computed_digests = await asyncio.gather(*(
+            self._run_adding_task(_compute_digest, gfile.get_path())
+            for key, gfile in candidates))
+        for (key, gfile), digest in zip(candidates, computed_digests):
+            # Not computed if cancelled
+            if digest is None:
+                groups.append([gfile])
+            else:
+                digests.setdefault((key, digest), []).append(gfile)
+        groups.extend(digests.values())
+        return groups
+
+    @traced
+    def _add_gfile(
+            self,
+            gfile: Gio.File,
+            identical_gfiles: List[Gio.File],
+            context: _GatheringContext,
+            cleaned: bool = False) -> List[File]:
+        annotate(path=gfile.get_path(), duplicates=len(identical_gfiles))
+        skip = False
         if not gfile.query_exists(None):
             logger.warning(
                 f"File {gfile.get_path()} does not exist, skipping.")
-            return
-
-        if bool(list(filter(lambda x: x.path == gfile.get_path(), self))):
+            skip = True
+        elif not self._reserve_path(gfile.get_path()):
             logger.warning(f"Skipping {gfile.get_path()}, already added.")
-            return
+            skip = True
+        if skip:
+            if identical_gfiles:
+                return self._add_gfile(
+                    identical_gfiles[0],
+                    identical_gfiles[1:],
+                    context,
+                    cleaned)
+            return []
 
-        f = File(gfile)
-        f.check_metadata()
+        f = File(
+            gfile,
+            context.get_root(gfile.get_path()),
+            self._get_parser,
+            self._dispatcher)
+        f.hardlinks = context.hardlinks.get(f.path, [])
+        f.size = context.sizes.get(f.path, 0)
+        duplicates = []
+        for identical_gfile in identical_gfiles:
+            if not self._reserve_path(identical_gfile.get_path()):
+                logger.warning(
+                    f"Skipping {identical_gfile.get_path()}, already added.")
+                continue
+            duplicate = File(
+                identical_gfile,
+                context.get_root(identical_gfile.get_path()),
+                self._get_parser,
+                self._dispatcher)
+            duplicate.hardlinks = context.hardlinks.get(duplicate.path, [])
+            duplicate.size = f.size
+            f.add_duplicate(duplicate)
+            duplicates.append(duplicate)
+        timings = self._timings
+        if timings:
+            f.timings = Timings()
+        if cleaned or self._is_cleaned_in_journal(f):
+            f.mark_as_cleaned()
+        else:
+            f.check_metadata()
+        if timings and f.timings:
+            timings.add_timings(f.timings)
+        if self._memory_profiler:
+            self._memory_profiler.count_files(1 + len(duplicates))
 
         def finish() -> bool:
-            self.append(f)
-            f.connect("state-changed", self._on_file_state_changed)
+            for added_file in [f, *duplicates]:
+                self.append(added_file)
+                self._files_by_path[added_file.path] = added_file
+                added_file.connect(
+                    "state-changed",
+                    self._on_file_state_changed)
+                if self.monitor_files:
+                    _MONITOR_DISPATCHER.dispatch(
+                        self._monitor_file, added_file)
             return GLib.SOURCE_REMOVE
-        GLib.idle_add(finish)
+        self._dispatcher.dispatch(finish)
+        return [f, *duplicates]
+
+    def _reserve_path(self, path: str) -> bool:
+        """Reserve the path of a file being added.
+
+        Returns:
+            bool: False if the file has already been added.
+        """
+        with self._add_condition:
+            if path in self._paths:
+                return False
+            self._paths.add(path)
+            return True
 
     def _stop_adding_gfiles(self) -> None:
-        self.add_files_executor.shutdown(wait=False, cancel_futures=True)
-        self.add_files_executor = ThreadPoolExecutor()
-        self._set_state(FileStoreState.IDLE)
-        self._set_progress(0, 0)
+        self._dump_memory_profile()
+        self._update_state()
+        self._adding_progress.reset()
 
     def cancel_addding_gfiles(self) -> None:
         """Cancel adding GFiles."""
-        self._stop_adding_gfiles()
+        with self._add_condition:
+            self._add_generation += 1
+            queued_requests = list(self._add_requests)
+            self._add_requests.clear()
+        for request in queued_requests:
+            self._finish_add_request(request)
+        # The requests being processed finish with their cancelled files
+        self._cancel_futures(FileStoreAction.ADDING)
 
     def remove_file(self, f: File) -> None:
         """Remove a file from the File Store.
@@ -254,42 +1243,402 @@ class FileStore(Gio.ListStore):
         Args:
             index (int): The index of the file to remove.
         """
+        f = self.get_file_with_index(index)
+        f.detach_duplicates()
+        if self.monitor_files:
+            _MONITOR_DISPATCHER.dispatch(self._unmonitor_file, f)
+        with self._add_condition:
+            self._paths.discard(f.path)
+        if self._files_by_path.get(f.path) is f:
+            del self._files_by_path[f.path]
         self.remove(index)
 
     def remove_files(self) -> None:
         """Remove all the files from the File Store."""
+        if self.monitor_files:
+            _MONITOR_DISPATCHER.dispatch(self._unmonitor_files)
+        with self._add_condition:
+            self._paths.clear()
+        self._files_by_path = {}
         self.remove_all()
 
-    def clean_files(self) -> None:
-        """Remove metadata from all the cleanable files."""
-        thread = Thread(target=self._clean_files_async, daemon=True)
-        thread.start()
-
-    def _clean_files_async(self) -> None:
-        cleanable_files = self.get_cleanable_files()
-        self._set_progress(
-            self.progress[0], self.progress[1] + len(cleanable_files))
-        self._set_state(FileStoreState.WORKING)
-        self.last_action = FileStoreAction.CLEANING
-        futures = {
-            self.clean_files_executor.submit(f.clean, self.lightweight_mode)
-            for f in cleanable_files
+    def clean_files(self, output_root: Optional[str] = None) -> None:
+        """Remove metadata from all the cleanable files.
+
+        Args:
+            output_root (str, optional): If set, the original files are kept
+                and the cleaned files are written in this directory, mirroring
+                the structure of the added folders. Defaults to None.
+        """
+        self._start_cleaning(output_root)
+
+    def iter_clean(
+            self,
+            output_root: Optional[str] = None,
+            max_pending: int = 64) -> Iterator[FileResult]:
+        """Clean the cleanable files, and get their results as they are done.
+
+        The cleaning starts when the iteration starts, as with clean_files().
+        The end of the cleaning waits while max_pending results are waiting to
+        be consumed, and stops waiting once the iteration is stopped.
+
+        Args:
+            output_root (str, optional): If set, the original files are kept
+                and the cleaned files are written in this directory, mirroring
+                the structure of the added folders. Defaults to None.
+            max_pending (int, optional): Maximum number of results waiting to
+                be consumed. Defaults to 64.
+
+        Yields:
+            FileResult: Results of the cleaned files, in the order they are
+                cleaned.
+        """
+        stream = ResultStream(max_pending)
+        self._start_cleaning(output_root, None, stream)
+        yield from stream
+
+    async def aiter_clean(
+            self,
+            output_root: Optional[str] = None,
+            max_pending: int = 64) -> AsyncIterator[FileResult]:
+        """Clean the cleanable files, and get their results as they are done.
+
+        Asynchronous version of iter_clean(), waiting for the results in the
+        running event loop without blocking a thread.
+
+        Args:
+            output_root (str, optional): If set, the original files are kept
+                and the cleaned files are written in this directory, mirroring
+                the structure of the added folders. Defaults to None.
+            max_pending (int, optional): Maximum number of results waiting to
+                be consumed. Defaults to 64.
+
+        Yields:
+            FileResult: Results of the cleaned files, in the order they are
+                cleaned.
+        """
+        stream = ResultStream(max_pending)
+        self._start_cleaning(output_root, None, stream)
+        async for result in self._aiter_stream(stream):
+            yield result
+
+    def _start_cleaning(
+            self,
+            output_root: Optional[str] = None,
+            files: Optional[List[File]] = None,
+            stream: Optional[ResultStream] = None) -> None:
+        job = _CleaningJob(output_root, files, stream)
+        # Registered before it runs, so that the File Store stays busy until
+        # all its jobs have ended
+        with self._futures_lock:
+            self._cleaning_jobs.append(job)
+            self._cleaning = True
+            job.future = self._orchestrator.submit(
+                self._clean_files_async, job)
+        self._update_state()
+        job.future.add_done_callback(
+            partial(self._on_cleaning_job_done, job))
+
+    def _on_cleaning_job_done(self, job: _CleaningJob, future: Future) -> None:
+        with self._futures_lock:
+            # Cancelled before it started, it won't end by itself
+            ended_without_running = not job.started and not job.ended
+            job.ended = True
+        if ended_without_running:
+            self._end_cleaning_job(job)
+        if job.stream:
+            job.stream.finish()
+
+    def _end_cleaning_job(self, job: _CleaningJob) -> None:
+        """Take back what a job didn't do, and stop if it was the last one."""
+        self._cleaning_progress.add(-job.files_left, -job.size_left)
+        with self._estimates_lock:
+            self._estimated_total -= job.estimate_left
+        with self._futures_lock:
+            self._cleaning_jobs.remove(job)
+            last_job = not self._cleaning_jobs
+            if last_job:
+                self._futures[FileStoreAction.CLEANING] = []
+                self._cleaning = False
+        if last_job:
+            self._stop_cleaning_files()
+
+    async def _clean_files_async(self, job: _CleaningJob) -> None:
+        """Clean files, in the event loop of the orchestrator.
+
+        The files are cleaned by the scheduler. Cancelling the job cancels the
+        cleanings not started yet.
+        """
+        with self._futures_lock:
+            if job.ended:
+                return
+            job.started = True
+        output_root = job.output_root
+        futures: Dict[asyncio.Future, File] = {}
+        try:
+            if job.files is None:
+                cleanable_files = self.get_cleanable_files()
+            else:
+                cleanable_files = [
+                    f for f in job.files
+                    if f.state in (
+                        FileState.HAS_METADATA,
+                        FileState.HAS_NO_METADATA)
+                ]
+            job.files_left = len(cleanable_files)
+            job.size_left = sum(f.size for f in cleanable_files)
+            self._cleaning_progress.add(job.files_left, job.size_left)
+            self.last_action = FileStoreAction.CLEANING
+            if output_root:
+                await asyncio.wrap_future(self._submit(
+                    FileStoreAction.CLEANING,
+                    self._create_output_directories,
+                    cleanable_files,
+                    output_root))
+            # Identical files are cleaned along with the file they duplicate
+            files_to_clean = [
+                f for f in cleanable_files if not f.duplicate_of]
+            estimates = self._start_estimating(files_to_clean, output_root)
+            job.estimate_left = sum(estimates.values())
+            # Futures in the order they are done, without waiting on all the
+            # pending ones each time
+            done: "asyncio.Queue[asyncio.Future]" = asyncio.Queue()
+            for f in files_to_clean:
+                future = asyncio.wrap_future(self._submit(
+                    FileStoreAction.CLEANING,
+                    self._clean_file, f, output_root))
+                future.add_done_callback(done.put_nowait)
+                futures[future] = f
+            for _ in range(len(futures)):
+                future = await done.get()
+                if future.cancelled():
+                    continue
+                f = futures[future]
+                files = [f, *f.duplicates]
+                size = sum(cleaned_file.size for cleaned_file in files)
+                job.files_left -= len(files)
+                job.size_left -= size
+                self._cleaning_progress.advance(len(files), size)
+                job.estimate_left -= estimates[f]
+                with self._estimates_lock:
+                    self._estimated_done += estimates[f]
+                if job.stream:
+                    for cleaned_file in files:
+                        await job.stream.put_async(cleaned_file)
+        finally:
+            # Cancels the tasks of a cancelled job, and only of this job
+            for future in futures:
+                future.cancel()
+            self._end_cleaning_job(job)
+
+    def _estimate_cleaning_duration(
+            self,
+            f: File,
+            output_root: Optional[str]) -> Optional[float]:
+        if not self._throughput:
+            return None
+        if output_root and f.state == FileState.HAS_NO_METADATA:
+            # Only copied
+            return 0
+        return self._throughput.estimate(f.mimetype, f.parser_name, f.size)
+
+    def _start_estimating(
+            self,
+            files: List[File],
+            output_root: Optional[str]) -> Dict[File, float]:
+        estimates = {
+            f: self._estimate_cleaning_duration(f, output_root)
+            for f in files
+        }
+        known_estimates = [e for e in estimates.values() if e is not None]
+        # Without estimates, files are expected to take the same time
+        default_estimate = (
+            sum(known_estimates) / len(known_estimates) if known_estimates
+            else 1.0)
+        weights = {
+            f: default_estimate if estimate is None else estimate
+            for f, estimate in estimates.items()
         }
-        for future in as_completed(futures):
-            current = self.progress[0] + 1
-            total = self.progress[1]
-            self._set_progress(current, total)
-        self._stop_cleaning_files()
+        with self._estimates_lock:
+            # Added to the estimates of the other jobs running
+            if self._cleaning_start_time is None:
+                self._cleaning_start_time = time.monotonic()
+            self._estimated_total += sum(weights.values())
+        return weights
+
+    def estimate_cleaning_duration(
+            self,
+            output_root: Optional[str] = None) -> Optional[float]:
+        """Estimate the duration of the cleaning of the cleanable files.
+
+        Args:
+            output_root (str, optional): The output directory the cleaning
+                would write to, see clean_files(). Defaults to None.
+
+        Returns:
+            Optional[float]: The estimated duration in seconds, or None if
+                there is no previous cleaning to estimate it from.
+        """
+        files = [
+            f for f in self.get_cleanable_files() if not f.duplicate_of]
+        if not files or not self._throughput:
+            return None
+        # Estimated once per format, run before each cleaning
+        formats: Dict[Tuple[str, Optional[str]], Tuple[int, int]] = {}
+        for f in files:
+            if output_root and f.state == FileState.HAS_NO_METADATA:
+                # Only copied
+                continue
+            key = (f.mimetype, f.parser_name)
+            count, size = formats.get(key, (0, 0))
+            formats[key] = (count + 1, size + f.size)
+        total = 0.0
+        for (mimetype, parser_name), (count, size) in formats.items():
+            estimate = self._throughput.estimate(
+                mimetype, parser_name, size, count)
+            if estimate is None:
+                return None
+            total += estimate
+        # Files are cleaned in parallel
+        return total / min(len(files), self._scheduler.max_workers)
+
+    def get_remaining_cleaning_time(self) -> Optional[float]:
+        """Get the remaining time of the running cleaning.
+
+        The estimated durations of the files left are scaled by how long the
+        files already cleaned actually took.
+
+        Returns:
+            Optional[float]: The remaining time in seconds, or None if it
+                can't be estimated yet.
+        """
+        with self._estimates_lock:
+            if self._cleaning_start_time is None \
+                    or self._estimated_done <= 0:
+                return None
+            elapsed = time.monotonic() - self._cleaning_start_time
+            return (
+                max(self._estimated_total - self._estimated_done, 0)
+                * elapsed / self._estimated_done)
+
+    def get_task_counts(self) -> Dict[FileStoreAction, Tuple[int, int]]:
+        """Count the tasks submitted to the scheduler and not done yet.
+
+        Returns:
+            Dict[FileStoreAction, Tuple[int, int]]: The number of tasks
+                waiting to be run and the number of tasks running, for each
+                action.
+        """
+        counts = {}
+        with self._futures_lock:
+            for action, futures in self._futures.items():
+                # Done futures are not needed anymore to cancel the action
+                futures[:] = [
+                    future for future in futures if not future.done()]
+                running = sum(future.running() for future in futures)
+                counts[action] = (len(futures) - running, running)
+        return counts
+
+    def get_progress(
+            self,
+            action: FileStoreAction) -> Tuple[int, int, int, int]:
+        """Get the progress of an action.
+
+        Args:
+            action (FileStoreAction): The action.
+
+        Returns:
+            Tuple[int, int, int, int]: The files done, the files to do, the
+                bytes done and the bytes to do.
+        """
+        if action == FileStoreAction.ADDING:
+            return self._adding_progress.get()
+        return self._cleaning_progress.get()
+
+    @traced
+    def _clean_file(self, f: File, output_root: Optional[str]) -> None:
+        annotate(path=f.path, duplicates=len(f.duplicates))
+        # The originals of files cleaned to an output directory keep their
+        # metadata, they must not be skipped when cleaning them again
+        journal = None if output_root else self._journal
+        files = [f, *f.duplicates]
+        if journal:
+            for journaled_file in files:
+                journal.record(journaled_file, FileState.REMOVING_METADATA)
+        # Files without metadata are only copied to the output directory
+        parsed = not (output_root and f.state == FileState.HAS_NO_METADATA)
+        start_time = time.monotonic()
+        f.clean(self.lightweight_mode, output_root, self.mark_cleaned_files)
+        duration = time.monotonic() - start_time
+        if self._timings and f.timings:
+            self._timings.add_timings(f.timings)
+        if self._memory_profiler:
+            self._memory_profiler.count_files(len(files))
+        if self._throughput and parsed and f.parser_name \
+                and f.state == FileState.CLEANED:
+            self._throughput.record(
+                f.mimetype, f.parser_name, f.size, duration)
+        if journal:
+            for journaled_file in files:
+                journal.record(journaled_file)
+        if self._monitors:
+            for cleaned_file in files:
+                if cleaned_file.state != FileState.CLEANED:
+                    continue
+                try:
+                    stat = os.stat(cleaned_file.path)
+                except OSError:
+                    continue
+                self._cleaned_stats[cleaned_file.path] = (
+                    stat.st_size, stat.st_mtime_ns)
+
+    def _create_output_directories(
+            self,
+            files: List[File],
+            output_root: str) -> None:
+        directories = set()
+        for f in files:
+            for path in [f.path, *f.hardlinks]:
+                directories.add(os.path.dirname(
+                    f.get_output_path(output_root, path)))
+        # Sorted so that parents are created before their children
+        for directory in sorted(directories):
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                logger.warning(
+                    f"Unable to create the output directory {directory}: {e}")
 
     def _stop_cleaning_files(self) -> None:
-        self.clean_files_executor.shutdown(wait=False, cancel_futures=True)
-        self.clean_files_executor = ThreadPoolExecutor()
-        self._set_state(FileStoreState.IDLE)
-        self._set_progress(0, 0)
+        """Save what the cleaning recorded, once all the jobs have ended."""
+        if self._journal:
+            self._journal.sync()
+        if self._throughput:
+            self._throughput.save()
+        if self._timings and self.timings_path:
+            try:
+                self._timings.dump(self.timings_path)
+            except OSError as e:
+                logger.warning(
+                    f"Unable to write the timings to {self.timings_path}: {e}")
+        self._dump_memory_profile()
+        with self._estimates_lock:
+            self._cleaning_start_time = None
+            self._estimated_total = 0.0
+            self._estimated_done = 0.0
+        self._update_state()
+        self._cleaning_progress.reset()
 
     def cancel_cleaning_files(self) -> None:
-        """Cancel the cleaning process."""
-        self._stop_cleaning_files()
+        """Cancel the cleaning process.
+
+        The File Store becomes idle once the cancelled jobs have ended.
+        """
+        with self._futures_lock:
+            futures = [job.future for job in self._cleaning_jobs]
+        for future in futures:
+            if future:
+                future.cancel()
 
     def get_cleanable_files(self) -> List[File]:
         """Get all the cleanable files.
@@ -0,0 +1,247 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Journal of the cleaning of files."""
+
+import gc
+import os
+import re
+
+from contextlib import suppress
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterator, List, Mapping, NamedTuple, Optional
+
+from metadatacleaner.modules.file import File, FileState
+from metadatacleaner.modules.logger import Logger as logger
+
+
+_ESCAPED_CHARACTER = re.compile(r"\\(.)")
+
+
+# States by their recorded value
+_STATES = {str(int(state)): state for state in FileState}
+
+
+def _escape(path: str) -> str:
+    return path.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _unescape_character(match: re.Match) -> str:
+    return "\n" if match.group(1) == "n" else match.group(1)
+
+
+def _unescape(escaped_path: str) -> str:
+    if "\\" not in escaped_path:
+        return escaped_path
+    return _ESCAPED_CHARACTER.sub(_unescape_character, escaped_path)
+
+
+class JournalEntry(NamedTuple):
+    """Last recorded state of a file."""
+
+    state: FileState
+    size: int
+    mtime_ns: int
+
+
+class JournalEntries(Mapping[str, JournalEntry]):
+    """Last recorded state of each file of a journal, by path.
+
+    Only the fields of the last line of each file are kept, and they are only
+    parsed when the entry of the file is looked up.
+    """
+
+    def __init__(self, fields: Dict[str, List[str]]) -> None:
+        """Journal entries initialization.
+
+        Args:
+            fields (Dict[str, List[str]]): Fields of the last line of each
+                file, by escaped path followed by a line break.
+        """
+        self._fields = fields
+
+    def __getitem__(self, path: str) -> JournalEntry:
+        """Get the last recorded state of a file.
+
+        Args:
+            path (str): Path of the file.
+
+        Raises:
+            KeyError: If the file isn't in the journal.
+
+        Returns:
+            JournalEntry: The entry of the file.
+        """
+        fields = self._fields[f"{_escape(path)}\n"]
+        try:
+            state, size, mtime_ns, escaped_path = fields
+            return JournalEntry(_STATES[state], int(size), int(mtime_ns))
+        except (KeyError, ValueError):
+            # Corrupted line
+            raise KeyError(path) from None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the paths of the files."""
+        return (
+            _unescape(escaped_path[:-1]) for escaped_path in self._fields)
+
+    def __len__(self) -> int:
+        """Count the files."""
+        return len(self._fields)
+
+    def get_paths(self, state: FileState) -> List[str]:
+        """Get the paths of the files last recorded with a state.
+
+        Args:
+            state (FileState): The state.
+
+        Returns:
+            List[str]: Paths of the files.
+        """
+        recorded_state = str(int(state))
+        return [
+            _unescape(escaped_path[:-1])
+            for escaped_path, fields in self._fields.items()
+            if fields[0] == recorded_state
+        ]
+
+    def get_lines(self) -> List[str]:
+        """Get the last line of each file.
+
+        Returns:
+            List[str]: The lines, ending with a line break.
+        """
+        return ["\t".join(fields) for fields in self._fields.values()]
+
+
+class Journal:
+    """Append-only journal of the state transitions of files.
+
+    Each transition is a line made of the state, the size and the modification
+    time of the file, and its path, separated by tabulations. Lines are
+    written as they come, but only synced to the disk by batches. The lines
+    superseded by later ones are dropped when the journal is replayed, once
+    there are enough of them.
+    """
+
+    SYNC_INTERVAL = 1.0
+    SYNC_BATCH_SIZE = 512
+    COMPACT_MIN_STALE_LINES = 10000
+
+    def __init__(self, path: str) -> None:
+        """Journal initialization.
+
+        Args:
+            path (str): Path of the journal file, created if needed.
+        """
+        self.path = path
+        self._lock = Lock()
+        self._file = open(
+            path, "a", encoding="utf-8", errors="surrogateescape")
+        self._pending = 0
+        self._last_sync = monotonic()
+
+    def record(self, f: File, state: Optional[FileState] = None) -> None:
+        """Record the state of a file.
+
+        Args:
+            f (File): The file.
+            state (FileState, optional): State to record. Defaults to the
+                current state of the file.
+        """
+        try:
+            stat = os.stat(f.path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size, mtime_ns = -1, -1
+        state = f.state if state is None else state
+        line = f"{int(state)}\t{size}\t{mtime_ns}\t{_escape(f.path)}\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if self._pending >= self.SYNC_BATCH_SIZE \
+                    or monotonic() - self._last_sync >= self.SYNC_INTERVAL:
+                self._sync()
+
+    def sync(self) -> None:
+        """Write the pending transitions to the disk."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._pending == 0:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = monotonic()
+
+    def close(self) -> None:
+        """Sync and close the journal."""
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    @staticmethod
+    def replay(path: str) -> JournalEntries:
+        """Read the last recorded state of each file from a journal.
+
+        The journal is compacted if most of its lines are stale.
+
+        Args:
+            path (str): Path of the journal file.
+
+        Returns:
+            JournalEntries: Last entry of each file. Empty if the journal
+                doesn't exist.
+        """
+        # Fields of the last line of each file, by escaped path
+        last_fields: Dict[str, List[str]] = {}
+        line_count = 0
+        try:
+            journal_file = open(
+                path, "r", encoding="utf-8", errors="surrogateescape")
+        except FileNotFoundError:
+            return JournalEntries(last_fields)
+        # Only acyclic objects are created, the garbage collector would only
+        # slow down the reading of large journals
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with journal_file:
+                fields: List[str] = []
+                for line in journal_file:
+                    line_count += 1
+                    fields = line.split("\t", 3)
+                    last_fields[fields[-1]] = fields
+            # Last line truncated by a crash
+            if fields and (
+                    len(fields) != 4 or not fields[-1].endswith("\n")):
+                del last_fields[fields[-1]]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        entries = JournalEntries(last_fields)
+        if line_count - len(entries) >= max(
+                Journal.COMPACT_MIN_STALE_LINES, len(entries)):
+            Journal._compact(path, entries.get_lines())
+        return entries
+
+    @staticmethod
+    def _compact(path: str, lines: List[str]) -> None:
+        temp_path = f"{path}.compact"
+        try:
+            with open(
+                    temp_path,
+                    "w",
+                    encoding="utf-8",
+                    errors="surrogateescape") as compact_file:
+                compact_file.writelines(lines)
+                compact_file.flush()
+                os.fsync(compact_file.fileno())
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Unable to compact the journal {path}: {e}")
+            with suppress(OSError):
+                os.remove(temp_path)
@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Profiling of the memory used while processing the files."""
+
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+from threading import Lock
+from typing import Dict, List, Optional
+
+from metadatacleaner.modules.tracing import get_pending_idle_callbacks
+
+
+# Environment variable giving the path of the JSON file the memory profile is
+# written to at the end of each adding and cleaning. Memory is only profiled
+# if set.
+MEMORY_PROFILE_ENVIRONMENT_VARIABLE = "METADATA_CLEANER_MEMORY_PROFILE"
+
+# Frames kept for each allocation traced
+_TRACEBACK_LIMIT = 8
+# Allocation sites written in the summary
+_TOP_ALLOCATION_SITES = 20
+
+
+def get_resident_set_size() -> Optional[int]:
+    """Get the memory of the process resident in RAM.
+
+    Returns:
+        Optional[int]: The resident set size in bytes, or None if it can't be
+            read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemoryProfiler:
+    """Profiler of the memory used while processing the files.
+
+    Every given number of files processed, a snapshot of the allocations is
+    taken with tracemalloc, and the live instances of some classes are
+    counted. The summary compares the last snapshot to the first one, to show
+    where the memory that wasn't freed was allocated.
+    """
+
+    def __init__(
+            self,
+            classes: Dict[str, type],
+            interval: int = 1000) -> None:
+        """Memory profiler initialization.
+
+        Tracing the allocations is started if it wasn't already.
+
+        Args:
+            classes (Dict[str, type]): Classes whose live instances are
+                counted, by name.
+            interval (int, optional): Number of files processed between two
+                snapshots. Defaults to 1000.
+        """
+        self.classes = classes
+        self.interval = interval
+        self._lock = Lock()
+        self._files = 0
+        self._next_snapshot = 0
+        self._first_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._checkpoints: List[Dict] = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACEBACK_LIMIT)
+
+    def count_files(self, files: int) -> None:
+        """Count files as processed, taking a snapshot if it is time to.
+
+        Args:
+            files (int): Number of files processed.
+        """
+        with self._lock:
+            self._files += files
+            if self._files >= self._next_snapshot:
+                self._next_snapshot = self._files + self.interval
+                self._take_snapshot()
+
+    def _take_snapshot(self) -> None:
+        # Called with the lock held
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if self._first_snapshot is None:
+            self._first_snapshot = snapshot
+        self._last_snapshot = snapshot
+        traced, peak = tracemalloc.get_traced_memory()
+        self._checkpoints.append({
+            "time": time.monotonic(),
+            "files": self._files,
+            "traced": traced,
+            "traced_peak": peak,
+            "rss": get_resident_set_size(),
+            "instances": self._count_instances(),
+            "pending_idle_callbacks": get_pending_idle_callbacks(),
+        })
+
+    def _count_instances(self) -> Dict[str, int]:
+        counts = {name: 0 for name in self.classes}
+        for obj in gc.get_objects():
+            for name, cls in self.classes.items():
+                if isinstance(obj, cls):
+                    counts[name] += 1
+        return counts
+
+    def to_dict(self) -> Dict:
+        """Summarize the profile.
+
+        Returns:
+            Dict: The checkpoints, with the files processed, the memory
+                traced and resident, the instances counted and the callbacks
+                pending in the main loop, and the sites
+                having allocated the most memory, in total and since the first
+                snapshot.
+        """
+        with self._lock:
+            checkpoints = list(self._checkpoints)
+            first_snapshot = self._first_snapshot
+            last_snapshot = self._last_snapshot
+        summary: Dict = {
+            "checkpoints": checkpoints,
+            "top_allocation_sites": [],
+            "top_growing_sites": [],
+        }
+        if last_snapshot is None or first_snapshot is None:
+            return summary
+        for statistic in last_snapshot.statistics("traceback")[
+                :_TOP_ALLOCATION_SITES]:
+            summary["top_allocation_sites"].append({
+                "traceback": statistic.traceback.format(),
+                "size": statistic.size,
+                "count": statistic.count,
+            })
+        for difference in last_snapshot.compare_to(
+                first_snapshot, "traceback")[:_TOP_ALLOCATION_SITES]:
+            summary["top_growing_sites"].append({
+                "traceback": difference.traceback.format(),
+                "size": difference.size,
+                "size_diff": difference.size_diff,
+                "count_diff": difference.count_diff,
+            })
+        return summary
+
+    def dump(self, path: str) -> None:
+        """Write the summary of the profile in a JSON file.
+
+        A snapshot is taken first, so that the summary is up to date.
+
+        Args:
+            path (str): Path of the JSON file.
+        """
+        with self._lock:
+            self._take_snapshot()
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
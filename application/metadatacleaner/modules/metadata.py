@@ -4,15 +4,77 @@
 """Metadata classes."""
 
 from gi.repository import Gio, GObject
+from typing import Callable, Optional
 
 
 class Metadata(GObject.GObject):
-    """Metadata object."""
+    """Metadata object.
+
+    Values longer than PREVIEW_LENGTH characters are only kept as a truncated
+    preview. If a loader is given, the full value can be loaded on demand with
+    load_full_value(), as long as loadable is True.
+    """
 
     __gtype_name__ = "Metadata"
 
+    PREVIEW_LENGTH = 1024
+
     key = GObject.Property(type=str)
     value = GObject.Property(type=str)
+    truncated = GObject.Property(type=bool, default=False)
+    loadable = GObject.Property(type=bool, default=False)
+
+    def __init__(
+            self,
+            key: str,
+            value: str,
+            loader: Optional[Callable[[], str]] = None) -> None:
+        """Metadata initialization.
+
+        Args:
+            key (str): Metadata key.
+            value (str): Metadata value.
+            loader (Callable[[], str], optional): Function returning the full
+                value, kept only if the value has to be truncated. Defaults to
+                None.
+        """
+        super().__init__(key=key)
+        value = str(value)
+        self._loader: Optional[Callable[[], str]] = None
+        if loader and len(value) > self.PREVIEW_LENGTH:
+            self.value = value[:self.PREVIEW_LENGTH]
+            self.truncated = True
+            self._loader = loader
+            self.loadable = True
+        else:
+            self.value = value
+
+    def load_full_value(self) -> str:
+        """Load the full value of the metadata.
+
+        This can be slow, it should not be called from the main thread.
+
+        Raises:
+            RuntimeError: If the value is truncated and its loader has been
+                dropped.
+
+        Returns:
+            str: The full value.
+        """
+        if not self.truncated:
+            return self.value
+        loader = self._loader
+        if not loader:
+            raise RuntimeError("The full value can't be loaded anymore.")
+        return str(loader())
+
+    def drop_loader(self) -> None:
+        """Forget how to load the full value, it can't be loaded anymore.
+
+        The preview is kept as the value.
+        """
+        self._loader = None
+        self.loadable = False
 
 
 class MetadataList(Gio.ListStore):
@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Event loop running the jobs of the File Stores.
+
+A job, such as adding or cleaning the files, is a coroutine: it submits its
+tasks to the scheduler, awaits them and keeps track of their progress. All the
+jobs share a single control thread instead of holding a thread each while
+waiting for their tasks, and cancelling a job cancels the tasks it is waiting
+for.
+"""
+
+import asyncio
+
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any, Callable, Coroutine, Optional
+
+from metadatacleaner.modules.logger import Logger as logger
+
+
+class Orchestrator:
+    """Event loop running the jobs of the File Stores."""
+
+    def __init__(
+            self,
+            loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Orchestrator initialization.
+
+        Args:
+            loop (asyncio.AbstractEventLoop, optional): Running event loop to
+                run the jobs in, for instance one integrated with the GLib
+                main loop. Defaults to an event loop of its own, running in a
+                control thread started with the first job.
+        """
+        self._loop = loop
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = Thread(
+                    target=self._loop.run_forever,
+                    name="orchestrator",
+                    daemon=True)
+                self._thread.start()
+            return self._loop
+
+    @staticmethod
+    def _on_job_done(future: Future) -> None:
+        if future.cancelled() or future.exception() is None:
+            return
+        logger.warning(f"Job failed: {future.exception()!r}")
+
+    def submit(
+            self,
+            job: Callable[..., Coroutine],
+            *args: Any) -> Future:
+        """Run a job.
+
+        Args:
+            job (Callable[..., Coroutine]): The coroutine function of the job.
+            *args: Arguments of the job.
+
+        Returns:
+            Future: Future of the result of the job. Cancelling it cancels the
+                job, and the tasks it is waiting for.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            job(*args), self._get_loop())
+        future.add_done_callback(self._on_job_done)
+        return future
+
+
+# Orchestrator of the File Stores not given one
+DEFAULT_ORCHESTRATOR = Orchestrator()
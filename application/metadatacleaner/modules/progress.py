@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Progress of a job run by multiple threads."""
+
+import time
+
+from threading import Lock, RLock, Timer
+from typing import Callable, Optional, Tuple
+
+
+class Progress:
+    """Progress of a job run by multiple threads.
+
+    The progress counts the files and bytes done and to do. It can be updated
+    from any thread, and is published at a capped rate, except when the job
+    is done, which is always published. Updates coming too soon after a
+    publication are published together once the delay is over.
+    """
+
+    # Minimum delay in seconds between two publications
+    PUBLISH_INTERVAL = 1 / 30
+
+    def __init__(self, publish: Callable[[int, int, int, int], None]) -> None:
+        """Progress initialization.
+
+        Args:
+            publish (Callable[[int, int, int, int], None]): Function called
+                with the files done, the files to do, the bytes done and the
+                bytes to do. It is called from the thread updating the
+                progress, or from a timer thread for the updates held back,
+                without holding the lock of the progress, and must return
+                quickly.
+        """
+        self._publish = publish
+        self._lock = Lock()
+        # Held while publishing, so that publications are ordered. Reentrant,
+        # as the published function can update the progress.
+        self._publish_lock = RLock()
+        self._current = 0
+        self._total = 0
+        self._bytes_done = 0
+        self._bytes_total = 0
+        self._last_publication = 0.0
+        self._flush_timer: Optional[Timer] = None
+
+    def get(self) -> Tuple[int, int, int, int]:
+        """Get the progress.
+
+        Returns:
+            Tuple[int, int, int, int]: The files done, the files to do, the
+                bytes done and the bytes to do.
+        """
+        with self._lock:
+            return (
+                self._current,
+                self._total,
+                self._bytes_done,
+                self._bytes_total)
+
+    def add(self, files: int, size: int = 0) -> None:
+        """Add files to do.
+
+        Args:
+            files (int): Number of files.
+            size (int, optional): Size of the files in bytes. Defaults to 0.
+        """
+        with self._lock:
+            self._total += files
+            self._bytes_total += size
+            publish = self._should_publish()
+        if publish:
+            self._publish_progress()
+
+    def advance(self, files: int, size: int = 0) -> None:
+        """Count files as done.
+
+        Args:
+            files (int): Number of files.
+            size (int, optional): Size of the files in bytes. Defaults to 0.
+        """
+        with self._lock:
+            self._current += files
+            self._bytes_done += size
+            publish = self._should_publish()
+        if publish:
+            self._publish_progress()
+
+    def reset(self) -> None:
+        """Reset the progress and publish it."""
+        with self._lock:
+            self._current = 0
+            self._total = 0
+            self._bytes_done = 0
+            self._bytes_total = 0
+            self._last_publication = time.monotonic()
+            self._cancel_flush()
+        self._publish_progress()
+
+    def _should_publish(self) -> bool:
+        """Check if the progress has to be published, with the lock held."""
+        now = time.monotonic()
+        delay = self._last_publication + self.PUBLISH_INTERVAL - now
+        if self._current != self._total and delay > 0:
+            if self._flush_timer is None:
+                self._flush_timer = Timer(delay, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            return False
+        self._last_publication = now
+        self._cancel_flush()
+        return True
+
+    def _cancel_flush(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _flush(self) -> None:
+        """Publish the updates held back by the capped rate."""
+        with self._lock:
+            if self._flush_timer is None:
+                # Published in the meantime
+                return
+            self._flush_timer = None
+            self._last_publication = time.monotonic()
+        self._publish_progress()
+
+    def _publish_progress(self) -> None:
+        with self._publish_lock:
+            # Read once the previous publications are done, so that a later
+            # publication is never older
+            progress = self.get()
+            self._publish(*progress)
@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Stream of the results of the processing of the files."""
+
+import asyncio
+
+from collections import deque
+from contextlib import suppress
+from threading import Condition
+from typing import Deque, Iterator, List, NamedTuple, Optional, Tuple
+
+from metadatacleaner.modules.file import File, FileState
+
+
+class FileResult(NamedTuple):
+    """Result of the processing of a file."""
+
+    path: str
+    state: FileState
+    size: int
+    error: Optional[str]
+    file: File
+
+    @classmethod
+    def from_file(cls, f: File) -> "FileResult":
+        """Get the result of a file in its current state.
+
+        Args:
+            f (File): The file.
+
+        Returns:
+            FileResult: The result.
+        """
+        return cls(
+            f.path,
+            f.state,
+            f.size,
+            str(f.error) if f.error else None,
+            f)
+
+
+class ResultStream:
+    """Bounded stream of results, from worker threads to a consumer.
+
+    Producers wait for room when the consumer falls behind. Once the consumer
+    closes the stream, results are dropped and nobody waits anymore. Both
+    sides can also wait in an asyncio event loop, without blocking a thread.
+    """
+
+    def __init__(self, max_pending: int = 64) -> None:
+        """Stream initialization.
+
+        Args:
+            max_pending (int, optional): Maximum number of results waiting to
+                be consumed. Defaults to 64.
+        """
+        self._max_pending = max_pending
+        self._results: Deque[FileResult] = deque()
+        self._condition = Condition()
+        self._finished = False
+        self._closed = False
+        # Event loops and futures of the coroutines waiting for a change
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] \
+            = []
+
+    def put(self, f: File) -> None:
+        """Add the result of a file, waiting for room if needed.
+
+        Args:
+            f (File): The file.
+        """
+        result = FileResult.from_file(f)
+        with self._condition:
+            self._condition.wait_for(self._can_put)
+            self._put(result)
+
+    async def put_async(self, f: File) -> None:
+        """Add the result of a file, waiting for room in the event loop.
+
+        Args:
+            f (File): The file.
+        """
+        result = FileResult.from_file(f)
+        while True:
+            with self._condition:
+                if self._can_put():
+                    self._put(result)
+                    return
+                waiter = self._add_waiter()
+            await waiter
+
+    def finish(self) -> None:
+        """Mark the end of the results, without waiting."""
+        with self._condition:
+            self._finished = True
+            self._notify()
+
+    def close(self) -> None:
+        """Stop consuming the results."""
+        with self._condition:
+            self._closed = True
+            self._results.clear()
+            self._notify()
+
+    def get(self) -> Optional[FileResult]:
+        """Get the next result, waiting for it if needed.
+
+        Returns:
+            Optional[FileResult]: The result, or None if there are no more
+                results or the stream is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(self._can_get)
+            return self._get()
+
+    async def get_async(self) -> Optional[FileResult]:
+        """Get the next result, waiting for it in the event loop.
+
+        Returns:
+            Optional[FileResult]: The result, or None if there are no more
+                results or the stream is closed.
+        """
+        while True:
+            with self._condition:
+                if self._can_get():
+                    return self._get()
+                waiter = self._add_waiter()
+            await waiter
+
+    def __iter__(self) -> Iterator[FileResult]:
+        """Iterate over the results until the end, then close the stream."""
+        try:
+            while (result := self.get()) is not None:
+                yield result
+        finally:
+            self.close()
+
+    def _can_put(self) -> bool:
+        return self._closed or self._max_pending <= 0 \
+            or len(self._results) < self._max_pending
+
+    def _put(self, result: FileResult) -> None:
+        if self._closed:
+            return
+        self._results.append(result)
+        self._notify()
+
+    def _can_get(self) -> bool:
+        # Results are all put before the end is marked
+        return self._closed or self._finished or bool(self._results)
+
+    def _get(self) -> Optional[FileResult]:
+        if self._closed or not self._results:
+            return None
+        result = self._results.popleft()
+        self._notify()
+        return result
+
+    def _add_waiter(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append((loop, waiter))
+        return waiter
+
+    def _notify(self) -> None:
+        """Wake up everyone waiting, with the condition held."""
+        self._condition.notify_all()
+        for loop, waiter in self._waiters:
+            # The event loop may have been closed since
+            with suppress(RuntimeError):
+                loop.call_soon_threadsafe(_wake_up, waiter)
+        self._waiters = []
+
+
+def _wake_up(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
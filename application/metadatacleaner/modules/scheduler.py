@@ -0,0 +1,200 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Pool of workers shared by the File Stores."""
+
+import os
+import time
+
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from metadatacleaner.modules.tracing import span
+
+
+# Future, function, arguments, keyword arguments and time it was queued at
+_Task = Tuple[Future, Callable, Tuple, dict, float]
+
+
+class SchedulerClient:
+    """Queue of tasks submitted to a scheduler.
+
+    Clients are served in turn, each one getting a share of the tasks run in
+    a round weighted by its priority, so that clients with a lower priority
+    are slowed down but never starved. The tasks of a paused client are kept
+    until it is resumed.
+    """
+
+    def __init__(self, scheduler: "Scheduler") -> None:
+        """Scheduler client initialization.
+
+        Args:
+            scheduler (Scheduler): The scheduler running the tasks.
+        """
+        self._scheduler = scheduler
+        self._tasks: Deque[_Task] = deque()
+        self._priority = 0
+        self._paused = False
+        # Number of tasks it can still run in the current round
+        self._deficit = 0.0
+
+    @property
+    def priority(self) -> int:
+        """Priority of the tasks, the highest get the largest share."""
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority: int) -> None:
+        with self._scheduler._condition:
+            self._priority = priority
+            self._scheduler._condition.notify_all()
+
+    @property
+    def paused(self) -> bool:
+        """Whether the tasks are kept from being run."""
+        return self._paused
+
+    @paused.setter
+    def paused(self, paused: bool) -> None:
+        with self._scheduler._condition:
+            self._paused = paused
+            self._scheduler._condition.notify_all()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit a task to the scheduler.
+
+        Args:
+            fn (Callable): The function to run.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Future: Future of the result of the function. Cancelling it
+                before the task is run prevents it from running.
+        """
+        future: Future = Future()
+        self._scheduler._enqueue(
+            self, (future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+
+class Scheduler:
+    """Pool of workers shared by the File Stores.
+
+    The number of tasks running at the same time is capped for the whole
+    application, whatever the number of clients submitting tasks. The tasks
+    are shared between the clients with deficit round-robin: in each round, a
+    client can run PRIORITY_WEIGHT times more tasks than a client with a
+    priority lower by one.
+    """
+
+    PRIORITY_WEIGHT = 4
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        """Scheduler initialization.
+
+        Args:
+            max_workers (int, optional): Maximum number of tasks running at
+                the same time. Defaults to the same number as
+                concurrent.futures.ThreadPoolExecutor.
+        """
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._condition = Condition()
+        # Clients having tasks, in the order they are served
+        self._clients: Deque[SchedulerClient] = deque()
+        self._workers: List[Thread] = []
+        self._idle_workers = 0
+        self._running_tasks = 0
+
+    def create_client(self) -> SchedulerClient:
+        """Create a client to submit tasks.
+
+        Returns:
+            SchedulerClient: The new client.
+        """
+        return SchedulerClient(self)
+
+    def get_statistics(self) -> Tuple[int, int, int]:
+        """Count the tasks and workers.
+
+        Returns:
+            Tuple[int, int, int]: The number of tasks waiting to be run, the
+                number of tasks running and the number of workers.
+        """
+        with self._condition:
+            return (
+                sum(len(client._tasks) for client in self._clients),
+                self._running_tasks,
+                len(self._workers))
+
+    def _enqueue(self, client: SchedulerClient, task: _Task) -> None:
+        with self._condition:
+            client._tasks.append(task)
+            if client not in self._clients:
+                self._clients.append(client)
+            if self._idle_workers == 0 \
+                    and len(self._workers) < self.max_workers:
+                worker = Thread(
+                    target=self._work,
+                    name=f"scheduler-worker-{len(self._workers)}",
+                    daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+
+    def _next_task(self) -> Optional[_Task]:
+        if all(client._paused for client in self._clients):
+            return None
+        while True:
+            client = self._clients[0]
+            if not client._paused and client._deficit >= 1:
+                client._deficit -= 1
+                task = client._tasks.popleft()
+                if not client._tasks:
+                    # It starts over when it has tasks again
+                    self._clients.popleft()
+                    client._deficit = 0.0
+                    self._start_turn()
+                return task
+            # Its share of the round is used, the next client is served
+            self._clients.rotate(-1)
+            self._start_turn()
+
+    def _start_turn(self) -> None:
+        """Give its share of the round to the client now being served."""
+        if not self._clients:
+            return
+        client = self._clients[0]
+        if not client._paused:
+            client._deficit += self.PRIORITY_WEIGHT ** client._priority
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    self._idle_workers += 1
+                    self._condition.wait()
+                    self._idle_workers -= 1
+                    task = self._next_task()
+            future, fn, args, kwargs, queued = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._condition:
+                self._running_tasks += 1
+            try:
+                with span(
+                        "task",
+                        "scheduler",
+                        queued,
+                        function=getattr(fn, "__qualname__", repr(fn))):
+                    result: Any = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running_tasks -= 1
@@ -0,0 +1,232 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Durations of past cleanings, to estimate the duration of the next ones."""
+
+import os
+import sqlite3
+
+from gettext import gettext as _
+from gettext import ngettext
+from gi.repository import GLib
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metadatacleaner.modules.logger import Logger as logger
+
+
+_MEGABYTE = 1024 * 1024
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for the user.
+
+    Args:
+        seconds (float): The duration in seconds.
+
+    Returns:
+        str: The rounded duration.
+    """
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return _("less than a minute")
+    if minutes < 60:
+        return ngettext("%i minute", "%i minutes", minutes) % minutes
+    hours = round(minutes / 60)
+    return ngettext("%i hour", "%i hours", hours) % hours
+
+
+class _Statistics:
+    """Sums needed to fit the duration of a cleaning to the file size.
+
+    The duration is modeled as a fixed cost per file plus a cost per
+    megabyte, fitted with the least squares method.
+    """
+
+    def __init__(
+            self,
+            count: int = 0,
+            sum_size: float = 0,
+            sum_duration: float = 0,
+            sum_size_squared: float = 0,
+            sum_size_duration: float = 0) -> None:
+        self.count = count
+        self.sum_size = sum_size
+        self.sum_duration = sum_duration
+        self.sum_size_squared = sum_size_squared
+        self.sum_size_duration = sum_size_duration
+
+    def add(self, size: float, duration: float) -> None:
+        self.count += 1
+        self.sum_size += size
+        self.sum_duration += duration
+        self.sum_size_squared += size * size
+        self.sum_size_duration += size * duration
+
+    def merge(self, statistics: "_Statistics") -> None:
+        self.count += statistics.count
+        self.sum_size += statistics.sum_size
+        self.sum_duration += statistics.sum_duration
+        self.sum_size_squared += statistics.sum_size_squared
+        self.sum_size_duration += statistics.sum_size_duration
+
+    def as_tuple(self) -> Tuple[int, float, float, float, float]:
+        return (
+            self.count,
+            self.sum_size,
+            self.sum_duration,
+            self.sum_size_squared,
+            self.sum_size_duration)
+
+    def estimate(self, size: float, files: int = 1) -> Optional[float]:
+        # The model is linear, files are estimated together from their total
+        # size
+        if self.count == 0:
+            return None
+        mean_duration = self.sum_duration / self.count
+        denominator = (
+            self.count * self.sum_size_squared - self.sum_size ** 2)
+        if self.count > 1 and denominator > 1e-9:
+            per_megabyte = (
+                self.count * self.sum_size_duration
+                - self.sum_size * self.sum_duration) / denominator
+            if per_megabyte >= 0:
+                per_file = (
+                    self.sum_duration - per_megabyte * self.sum_size
+                ) / self.count
+                return max(per_file * files + per_megabyte * size, 0)
+        # Not enough different sizes for a fit, assume a constant throughput
+        if self.sum_size > 0:
+            return self.sum_duration / self.sum_size * size
+        return mean_duration * files
+
+
+class ThroughputDatabase:
+    """Durations of past cleanings, to estimate the duration of the next ones.
+
+    Durations are recorded per mimetype and parser. They are kept in memory
+    until save() is called, which writes them in an SQLite database.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Throughput database initialization.
+
+        Args:
+            path (str, optional): Path of the database. Defaults to a file in
+                the user data directory.
+        """
+        self.path = path or os.path.join(
+            GLib.get_user_data_dir(), "metadata-cleaner", "throughput.sqlite")
+        self._lock = Lock()
+        self._statistics: Optional[Dict[Tuple[str, str], _Statistics]] = None
+        self._new_statistics: Dict[Tuple[str, str], _Statistics] = {}
+
+    def _load(self) -> Dict[Tuple[str, str], _Statistics]:
+        # Loaded on first use, called with the lock held
+        if self._statistics is not None:
+            return self._statistics
+        self._statistics = {}
+        if not os.path.exists(self.path):
+            return self._statistics
+        try:
+            with sqlite3.connect(self.path) as connection:
+                rows = connection.execute(
+                    "SELECT mimetype, parser, count, sum_size, sum_duration, "
+                    "sum_size_squared, sum_size_duration FROM throughput")
+                for mimetype, parser, *sums in rows:
+                    self._statistics[(mimetype, parser)] = _Statistics(*sums)
+        except sqlite3.Error as e:
+            logger.warning(
+                f"Unable to read the throughput database {self.path}: {e}")
+        return self._statistics
+
+    def record(
+            self,
+            mimetype: str,
+            parser: str,
+            size: int,
+            duration: float) -> None:
+        """Record the duration of a cleaning.
+
+        Args:
+            mimetype (str): Mimetype of the cleaned file.
+            parser (str): Name of the parser that cleaned the file.
+            size (int): Size of the file in bytes.
+            duration (float): Duration of the cleaning in seconds.
+        """
+        with self._lock:
+            key = (mimetype, parser)
+            for statistics in (self._load(), self._new_statistics):
+                statistics.setdefault(key, _Statistics()).add(
+                    size / _MEGABYTE, duration)
+
+    def estimate(
+            self,
+            mimetype: str,
+            parser: Optional[str],
+            size: int,
+            files: int = 1) -> Optional[float]:
+        """Estimate the duration of the cleaning of files of the same format.
+
+        Files of a format never cleaned before are estimated from the other
+        files handled by the same parser, or else from all the files.
+
+        Args:
+            mimetype (str): Mimetype of the files.
+            parser (str, optional): Name of the parser handling the files.
+            size (int): Total size of the files in bytes.
+            files (int, optional): Number of files. Defaults to 1.
+
+        Returns:
+            Optional[float]: The estimated duration in seconds, or None if no
+                cleaning has been recorded.
+        """
+        with self._lock:
+            statistics = self._load()
+            candidates: List[Iterable[_Statistics]] = []
+            # Only cleanings by a parser are recorded
+            if parser is not None:
+                candidates += [
+                    [statistics.get((mimetype, parser), _Statistics())],
+                    [s for (m, p), s in statistics.items() if p == parser],
+                ]
+            candidates.append(statistics.values())
+            for candidate in candidates:
+                merged = _Statistics()
+                for s in candidate:
+                    merged.merge(s)
+                estimate = merged.estimate(size / _MEGABYTE, files)
+                if estimate is not None:
+                    return estimate
+        return None
+
+    def save(self) -> None:
+        """Write the durations recorded since the last save."""
+        with self._lock:
+            new_statistics, self._new_statistics = self._new_statistics, {}
+        if not new_statistics:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with sqlite3.connect(self.path) as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS throughput ("
+                    "mimetype TEXT, parser TEXT, count INTEGER, "
+                    "sum_size REAL, sum_duration REAL, "
+                    "sum_size_squared REAL, sum_size_duration REAL, "
+                    "PRIMARY KEY (mimetype, parser))")
+                for (mimetype, parser), statistics in new_statistics.items():
+                    connection.execute(
+                        "INSERT INTO throughput VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (mimetype, parser) DO UPDATE SET "
+                        "count = count + excluded.count, "
+                        "sum_size = sum_size + excluded.sum_size, "
+                        "sum_duration = sum_duration + excluded.sum_duration, "
+                        "sum_size_squared = "
+                        "sum_size_squared + excluded.sum_size_squared, "
+                        "sum_size_duration = "
+                        "sum_size_duration + excluded.sum_size_duration",
+                        (mimetype, parser, *statistics.as_tuple()))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(
+                f"Unable to write the throughput database {self.path}: {e}")
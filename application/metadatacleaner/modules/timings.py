@@ -0,0 +1,197 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Timing of the phases of the processing of the files."""
+
+import json
+import math
+import time
+
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Environment variable giving the path of the JSON file the timings are
+# dumped to at the end of each cleaning. Timings are only collected if set.
+TIMINGS_ENVIRONMENT_VARIABLE = "METADATA_CLEANER_TIMINGS"
+
+# Buckets of the histograms grow by this factor, i.e. about 19 %
+_BUCKET_BASE = 2 ** 0.25
+# Durations shorter than this are counted in the first bucket
+_MIN_DURATION = 1e-6
+
+
+class Timings:
+    """Timings of the phases of the processing of a file.
+
+    Each phase is recorded with its start, as a monotonic time, and its
+    duration, both in seconds.
+    """
+
+    def __init__(self) -> None:
+        """File timings initialization."""
+        self.mimetype = "unknown"
+        self.phases: List[Tuple[str, float, float]] = []
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._reported = 0
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """Measure the duration of a phase.
+
+        Args:
+            phase (str): Name of the phase.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases.append((phase, start, time.monotonic() - start))
+
+    def pop_unreported_phases(self) -> List[Tuple[str, float, float]]:
+        """Get the phases recorded since this method was last called.
+
+        Returns:
+            List[Tuple[str, float, float]]: The name, start and duration of the
+                phases.
+        """
+        phases = self.phases[self._reported:]
+        self._reported = len(self.phases)
+        return phases
+
+
+class _Histogram:
+    """Histogram of durations with logarithmic buckets."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        bucket = math.floor(
+            math.log(max(duration, _MIN_DURATION) / _MIN_DURATION,
+                     _BUCKET_BASE))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, percentile: float) -> float:
+        rank = math.ceil(self.count * percentile / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # Upper bound of the bucket
+                return _MIN_DURATION * _BUCKET_BASE ** (bucket + 1)
+        return 0.0
+
+    def summarize(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class TimingHistograms:
+    """Histograms of the durations of the phases, per mimetype."""
+
+    def __init__(self) -> None:
+        """Histograms initialization."""
+        self._lock = Lock()
+        self._histograms: Dict[Tuple[str, Optional[str]], _Histogram] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add_duration(
+            self,
+            phase: str,
+            duration: float,
+            mimetype: Optional[str] = None) -> None:
+        """Count the duration of a phase.
+
+        Args:
+            phase (str): Name of the phase.
+            duration (float): Duration in seconds.
+            mimetype (str, optional): Mimetype of the file the phase processed,
+                if any. Defaults to None.
+        """
+        with self._lock:
+            keys: List[Tuple[str, Optional[str]]] = [(phase, None)]
+            if mimetype:
+                keys.append((phase, mimetype))
+            for key in keys:
+                self._histograms.setdefault(key, _Histogram()).add(duration)
+
+    def add_timings(self, timings: Timings) -> None:
+        """Count the phases of a file not counted yet.
+
+        Args:
+            timings (Timings): The timings of the file.
+        """
+        for phase, start, duration in timings.pop_unreported_phases():
+            self.add_duration(phase, duration, timings.mimetype)
+        with self._lock:
+            self.bytes_read += timings.bytes_read
+            self.bytes_written += timings.bytes_written
+            timings.bytes_read = 0
+            timings.bytes_written = 0
+
+    def get_percentile(
+            self,
+            phase: str,
+            percentile: float,
+            mimetype: Optional[str] = None) -> Optional[float]:
+        """Get a percentile of the durations of a phase.
+
+        Args:
+            phase (str): Name of the phase.
+            percentile (float): The percentile, between 0 and 100.
+            mimetype (str, optional): Only count the files of this mimetype.
+                Defaults to None.
+
+        Returns:
+            Optional[float]: The duration in seconds, rounded up to the bucket
+                it is in, or None if the phase wasn't recorded.
+        """
+        with self._lock:
+            histogram = self._histograms.get((phase, mimetype))
+            if histogram is None:
+                return None
+            return histogram.percentile(percentile)
+
+    def to_dict(self) -> Dict:
+        """Summarize the histograms.
+
+        Returns:
+            Dict: Count, total, p50, p95 and p99 of each phase, for all the
+                files and per mimetype, and the bytes read and written.
+        """
+        summary: Dict = {
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "phases": {},
+            "mimetypes": {},
+        }
+        with self._lock:
+            for (phase, mimetype), histogram in self._histograms.items():
+                if mimetype is None:
+                    summary["phases"][phase] = histogram.summarize()
+                else:
+                    summary["mimetypes"].setdefault(mimetype, {})[phase] = \
+                        histogram.summarize()
+        return summary
+
+    def dump(self, path: str) -> None:
+        """Write the summary of the histograms in a JSON file.
+
+        Args:
+            path (str): Path of the JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
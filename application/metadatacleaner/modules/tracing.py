@@ -0,0 +1,302 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tracing of the processing of the files, in the Chrome trace format.
+
+The traces can be opened in a trace viewer such as Perfetto UI or
+chrome://tracing, to see what each thread was doing and for how long.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from functools import wraps
+from gi.repository import GLib
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from metadatacleaner.modules.logger import Logger as logger
+
+
+# Environment variable giving the path of the JSON file the trace is written
+# to when the application exits. Nothing is traced if not set.
+TRACE_ENVIRONMENT_VARIABLE = "METADATA_CLEANER_TRACE"
+
+
+class Tracer:
+    """Recorder of trace events.
+
+    Events can be recorded from any thread. They are kept in memory until
+    save() is called.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Tracer initialization.
+
+        Args:
+            path (str): Path of the JSON file the trace is written to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._events: List[Dict[str, Any]] = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": self._pid,
+            "args": {"name": "metadata-cleaner"},
+        }]
+        self._named_threads: Set[int] = set()
+
+    def _to_microseconds(self, timestamp: float) -> float:
+        return (timestamp - self._origin) * 1e6
+
+    def add_span(
+            self,
+            name: str,
+            start: float,
+            end: float,
+            category: str = "app",
+            args: Optional[Dict[str, Any]] = None) -> None:
+        """Record a span of time spent by the current thread.
+
+        Args:
+            name (str): Name of the span.
+            start (float): Start of the span, from time.perf_counter().
+            end (float): End of the span, from time.perf_counter().
+            category (str, optional): Category of the span. Defaults to "app".
+            args (Dict[str, Any], optional): Arguments shown with the span.
+                Defaults to None.
+        """
+        tid = threading.get_ident()
+        event: Dict[str, Any] = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "pid": self._pid,
+            "tid": tid,
+            "ts": self._to_microseconds(start),
+            "dur": (end - start) * 1e6,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if tid not in self._named_threads:
+                self._named_threads.add(tid)
+                self._events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": {"name": threading.current_thread().name},
+                })
+            self._events.append(event)
+
+    def save(self) -> None:
+        """Write the events recorded so far."""
+        with self._lock:
+            events = list(self._events)
+        try:
+            with open(self.path, "w") as f:
+                json.dump(
+                    {"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        except OSError as e:
+            logger.warning(f"Unable to write the trace to {self.path}: {e}")
+
+
+_tracer: Optional[Tracer] = None
+# Callbacks added with idle_add() and not dispatched yet
+_pending_idle_callbacks = 0
+_pending_idle_callbacks_lock = threading.Lock()
+# Spans open in each thread, so that arguments can be added to the innermost
+_open_spans = threading.local()
+
+
+class _Span:
+
+    def __init__(
+            self,
+            tracer: Tracer,
+            name: str,
+            category: str,
+            args: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self.args = args
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        if not hasattr(_open_spans, "stack"):
+            _open_spans.stack = []
+        _open_spans.stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter()
+        _open_spans.stack.pop()
+        self._tracer.add_span(
+            self._name, self._start, end, self._category, self.args)
+
+
+class _NoSpan:
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def start(path: str) -> None:
+    """Start tracing.
+
+    The trace is written when stop() is called, or when the application
+    exits.
+
+    Args:
+        path (str): Path of the JSON file the trace is written to.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.save()
+    else:
+        atexit.register(stop)
+    _tracer = Tracer(path)
+    logger.info(f"Tracing to {path}.")
+
+
+def stop() -> None:
+    """Stop tracing and write the trace."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.save()
+
+
+def is_enabled() -> bool:
+    """Get whether tracing is enabled.
+
+    Returns:
+        bool: True if tracing is enabled.
+    """
+    return _tracer is not None
+
+
+def span(
+        name: str,
+        category: str = "app",
+        queued: Optional[float] = None,
+        **args: Any) -> Any:
+    """Trace the time spent in a block of code.
+
+    To be used as a context manager. It does nothing if tracing is disabled.
+
+    Args:
+        name (str): Name of the span.
+        category (str, optional): Category of the span. Defaults to "app".
+        queued (float, optional): Time, from time.perf_counter(), the work
+            was queued at. The time it waited is added to the arguments.
+            Defaults to None.
+        **args: Arguments shown with the span.
+
+    Returns:
+        The context manager.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NO_SPAN
+    if queued is not None:
+        args["wait_ms"] = (time.perf_counter() - queued) * 1e3
+    return _Span(tracer, name, category, args)
+
+
+def annotate(**args: Any) -> None:
+    """Add arguments to the innermost span open in the current thread.
+
+    Args:
+        **args: Arguments shown with the span.
+    """
+    if _tracer is None:
+        return
+    stack = getattr(_open_spans, "stack", None)
+    if stack:
+        stack[-1].args.update(args)
+
+
+def traced(function: Callable) -> Callable:
+    """Trace the time spent in a function.
+
+    Args:
+        function (Callable): The function to trace.
+
+    Returns:
+        Callable: The traced function.
+    """
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return function(*args, **kwargs)
+        with _Span(tracer, name, "app", {}):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def idle_add(function: Callable, *args: Any) -> int:
+    """Call a function in the main loop, tracing its dispatch.
+
+    Same as GLib.idle_add(), the time the function waited to be dispatched
+    and the time it ran are traced. The function is counted as pending until
+    it is first dispatched.
+
+    Args:
+        function (Callable): The function to call.
+        *args: Arguments of the function.
+
+    Returns:
+        int: ID of the event source.
+    """
+    global _pending_idle_callbacks
+    name = getattr(function, "__qualname__", "idle")
+    queued = time.perf_counter()
+    dispatched = False
+
+    def dispatch(*args: Any) -> bool:
+        global _pending_idle_callbacks
+        nonlocal dispatched
+        if not dispatched:
+            dispatched = True
+            with _pending_idle_callbacks_lock:
+                _pending_idle_callbacks -= 1
+        with span(name, "mainloop", queued):
+            return function(*args)
+    with _pending_idle_callbacks_lock:
+        _pending_idle_callbacks += 1
+    return GLib.idle_add(dispatch, *args)
+
+
+def get_pending_idle_callbacks() -> int:
+    """Count the functions added with idle_add() and not dispatched yet.
+
+    Returns:
+        int: The number of functions.
+    """
+    return _pending_idle_callbacks
+
+
+def _start_from_environment() -> None:
+    path = os.environ.get(TRACE_ENVIRONMENT_VARIABLE)
+    if path:
+        start(path)
+
+
+_start_from_environment()
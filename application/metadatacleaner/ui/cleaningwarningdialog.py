@@ -3,7 +3,11 @@
 
 """Dialog warning the user of possible data loss on cleaning."""
 
+from gettext import gettext as _
 from gi.repository import Gio, GObject, Gtk
+from typing import Optional
+
+from metadatacleaner.modules.throughput import format_duration
 
 
 @Gtk.Template(
@@ -19,6 +23,26 @@ class CleaningWarningDialog(Gtk.MessageDialog):
 
     _checkbutton: Gtk.CheckButton = Gtk.Template.Child()
 
+    def __init__(self, *args, **kwargs) -> None:
+        """Warning dialog initialization."""
+        super().__init__(*args, **kwargs)
+        self._warning_text = self.props.secondary_text
+
+    def set_estimated_duration(self, duration: Optional[float]) -> None:
+        """Show how long the cleaning is expected to take.
+
+        Args:
+            duration (float, optional): The estimated duration in seconds, or
+                None if unknown.
+        """
+        if duration is None:
+            self.props.secondary_text = self._warning_text
+            return
+        self.props.secondary_text = "\n".join((
+            self._warning_text,
+            _("The cleaning will take about {}.").format(
+                format_duration(duration))))
+
     @Gtk.Template.Callback()
     def _on_settings_changed(self, dialog, p_spec: GObject.ParamSpec) -> None:
         if not self.settings:
@@ -21,3 +21,6 @@ class FolderChooserDialog(Gtk.FileChooserNative):
         self.add_choice(
             "recursive", _("Add files from subfolders"), None, None)
         self.set_choice("recursive", "true")
+        self.add_choice(
+            "follow-symlinks", _("Follow symbolic links"), None, None)
+        self.set_choice("follow-symlinks", "true")
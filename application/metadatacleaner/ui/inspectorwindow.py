@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Window showing live statistics of the processing, in devel builds."""
+
+import time
+
+from gettext import gettext as _
+from gi.repository import Adw, GLib, GObject, Gtk
+from typing import Optional, Tuple
+
+from metadatacleaner.modules.filestore import FileStore, FileStoreAction
+from metadatacleaner.modules.memoryprofiler import get_resident_set_size
+from metadatacleaner.modules.scheduler import Scheduler
+from metadatacleaner.modules.tracing import get_pending_idle_callbacks
+
+
+@Gtk.Template(
+    resource_path="/fr/romainvigier/MetadataCleaner/ui/InspectorWindow.ui"
+)
+class InspectorWindow(Adw.Window):
+    """Window showing live statistics of the processing, in devel builds.
+
+    The statistics are refreshed every second while the window is shown.
+    """
+
+    __gtype_name__ = "InspectorWindow"
+
+    file_store: FileStore = GObject.Property(type=FileStore, nick="file-store")
+
+    _scheduler_queue_label: Gtk.Label = Gtk.Template.Child()
+    _workers_label: Gtk.Label = Gtk.Template.Child()
+    _adding_tasks_label: Gtk.Label = Gtk.Template.Child()
+    _cleaning_tasks_label: Gtk.Label = Gtk.Template.Child()
+    _files_rate_label: Gtk.Label = Gtk.Template.Child()
+    _bytes_rate_label: Gtk.Label = Gtk.Template.Child()
+    _idle_callbacks_label: Gtk.Label = Gtk.Template.Child()
+    _files_label: Gtk.Label = Gtk.Template.Child()
+    _memory_label: Gtk.Label = Gtk.Template.Child()
+
+    def __init__(self, scheduler: Scheduler, *args, **kwargs) -> None:
+        """Inspector window initialization.
+
+        Args:
+            scheduler (Scheduler): The scheduler running the tasks.
+        """
+        super().__init__(*args, **kwargs)
+        self._scheduler = scheduler
+        self._refresh_source_id: Optional[int] = None
+        self._last_refresh: Optional[Tuple[float, int, int]] = None
+
+    @Gtk.Template.Callback()
+    def _on_mapped(self, widget: Gtk.Widget) -> None:
+        self._last_refresh = None
+        self._refresh()
+        self._refresh_source_id = GLib.timeout_add_seconds(1, self._refresh)
+
+    @Gtk.Template.Callback()
+    def _on_unmapped(self, widget: Gtk.Widget) -> None:
+        if self._refresh_source_id is not None:
+            GLib.source_remove(self._refresh_source_id)
+            self._refresh_source_id = None
+
+    def _refresh(self) -> bool:
+        queued, running, workers = self._scheduler.get_statistics()
+        self._scheduler_queue_label.set_label(str(queued))
+        self._workers_label.set_label(f"{running}/{workers}")
+        if self.file_store:
+            task_counts = self.file_store.get_task_counts()
+            self._adding_tasks_label.set_label(
+                "{}/{}".format(*task_counts[FileStoreAction.ADDING]))
+            self._cleaning_tasks_label.set_label(
+                "{}/{}".format(*task_counts[FileStoreAction.CLEANING]))
+            self._files_label.set_label(str(len(self.file_store)))
+            self._refresh_rates()
+        self._idle_callbacks_label.set_label(
+            str(get_pending_idle_callbacks()))
+        rss = get_resident_set_size()
+        self._memory_label.set_label(
+            GLib.format_size(rss) if rss is not None else _("Unknown"))
+        return GLib.SOURCE_CONTINUE
+
+    def _refresh_rates(self) -> None:
+        now = time.monotonic()
+        files_done = 0
+        bytes_done = 0
+        for action in FileStoreAction:
+            current, total, action_bytes_done, bytes_total = \
+                self.file_store.get_progress(action)
+            files_done += current
+            bytes_done += action_bytes_done
+        if self._last_refresh is not None:
+            last_time, last_files_done, last_bytes_done = self._last_refresh
+            elapsed = now - last_time
+            # The progress is reset when an action is done
+            files_rate = max(files_done - last_files_done, 0) / elapsed
+            bytes_rate = max(bytes_done - last_bytes_done, 0) / elapsed
+            self._files_rate_label.set_label(f"{files_rate:.1f}")
+            self._bytes_rate_label.set_label(
+                GLib.format_size(int(bytes_rate)))
+        self._last_refresh = (now, files_done, bytes_done)
@@ -1,18 +1,90 @@
 # SPDX-FileCopyrightText: Metadata Cleaner contributors
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-"""Row displaying a metadata."""
+"""Row displaying a metadata, or the file the following metadata belong to."""
 
-from gi.repository import GObject, Gtk
+from gi.repository import GLib, GObject, Gtk
+from threading import Thread
+
+from metadatacleaner.modules.logger import Logger as logger
+from metadatacleaner.modules.metadata import Metadata, MetadataFile
 
 
 @Gtk.Template(
     resource_path="/fr/romainvigier/MetadataCleaner/ui/MetadataDetailsRow.ui"
 )
-class MetadataDetailsRow(Gtk.ListBoxRow):
-    """Row displaying a metadata."""
+class MetadataDetailsRow(Gtk.Box):
+    """Row displaying a metadata, or the file the following metadata belong to.
+
+    Rows are recycled by the list view, so their content is entirely derived
+    from the item they are bound to.
+    """
 
     __gtype_name__ = "MetadataDetailsRow"
 
+    item = GObject.Property(type=GObject.Object)
+    filename = GObject.Property(type=str, default="")
     key = GObject.Property(type=str, default="")
     value = GObject.Property(type=str, default="")
+    truncated = GObject.Property(type=bool, default=False)
+    loadable = GObject.Property(type=bool, default=False)
+
+    _stack: Gtk.Stack = Gtk.Template.Child()
+    _full_value_button: Gtk.Button = Gtk.Template.Child()
+
+    @Gtk.Template.Callback()
+    def _on_item_changed(
+            self,
+            widget: Gtk.Widget,
+            pspec: GObject.ParamSpec) -> None:
+        if isinstance(self.item, MetadataFile):
+            self.filename = self.item.filename
+            self._stack.set_visible_child_name("file")
+            self.remove_css_class("metadata")
+            self.add_css_class("metadata-file")
+        elif isinstance(self.item, Metadata):
+            self.key = self.item.key
+            self.value = (
+                f"{self.item.value}…" if self.item.truncated
+                else self.item.value)
+            self.truncated = self.item.truncated
+            self.loadable = self.item.loadable
+            self._full_value_button.set_sensitive(True)
+            self._stack.set_visible_child_name("metadata")
+            self.remove_css_class("metadata-file")
+            self.add_css_class("metadata")
+
+    @Gtk.Template.Callback()
+    def _on_full_value_button_clicked(self, button: Gtk.Button) -> None:
+        metadata = self.item
+        if not isinstance(metadata, Metadata):
+            return
+        button.set_sensitive(False)
+
+        def load() -> None:
+            try:
+                value = metadata.load_full_value()
+            except Exception as e:
+                logger.warning(
+                    f"Error while loading the full value of {metadata.key}: "
+                    f"{e}")
+                GLib.idle_add(finish, None)
+            else:
+                GLib.idle_add(finish, value)
+
+        def finish(value) -> bool:
+            # The row may have been recycled for another metadata meanwhile
+            if self.item != metadata:
+                return GLib.SOURCE_REMOVE
+            if value is None:
+                # Hidden if the file has been cleaned meanwhile
+                self.loadable = metadata.loadable
+                button.set_sensitive(True)
+                return GLib.SOURCE_REMOVE
+            self.value = value
+            self.truncated = False
+            self.loadable = False
+            return GLib.SOURCE_REMOVE
+
+        thread = Thread(target=load, daemon=True)
+        thread.start()
@@ -3,10 +3,11 @@
 
 """List of multiple files' metadata."""
 
-from gi.repository import GObject, Gtk
+from gi.repository import Gio, GObject, Gtk
+from typing import Optional
 
-from metadatacleaner.modules.metadata import MetadataStore
-from metadatacleaner.ui.metadatadetails import MetadataDetails
+from metadatacleaner.modules.metadata import MetadataFile, MetadataStore
+from metadatacleaner.ui.metadatadetailsrow import MetadataDetailsRow
 
 
 @Gtk.Template(
@@ -17,4 +18,30 @@ class MetadataView(Gtk.ScrolledWindow):
 
     __gtype_name__ = "MetadataView"
 
+    # Above this number of files (e.g. archive members), the files are shown
+    # collapsed and their metadata are only listed when expanded.
+    _AUTOEXPAND_MAX_FILES = 10
+
     metadata = GObject.Property(type=MetadataStore)
+
+    _selection_model: Gtk.NoSelection = Gtk.Template.Child()
+
+    @Gtk.Template.Callback()
+    def _on_metadata_changed(
+            self,
+            widget: Gtk.Widget,
+            pspec: GObject.ParamSpec) -> None:
+        if not self.metadata:
+            self._selection_model.set_model(None)
+            return
+        self._selection_model.set_model(Gtk.TreeListModel.new(
+            self.metadata,
+            False,
+            len(self.metadata) <= self._AUTOEXPAND_MAX_FILES,
+            _create_child_model))
+
+
+def _create_child_model(item: GObject.Object) -> Optional[Gio.ListModel]:
+    if isinstance(item, MetadataFile):
+        return item.metadata
+    return None
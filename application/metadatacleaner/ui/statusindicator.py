@@ -6,9 +6,11 @@
 from gettext import gettext as _
 from gettext import ngettext
 from gi.repository import Gio, GLib, GObject, Gtk
+from typing import Dict, Optional, Tuple
 
 from metadatacleaner.modules.filestore \
     import FileStore, FileStoreAction, FileStoreState
+from metadatacleaner.modules.throughput import format_duration
 
 
 @Gtk.Template(
@@ -27,10 +29,19 @@ class StatusIndicator(Gtk.Stack):
     def __init__(self, *args, **kwargs) -> None:
         """Status indicator initialization."""
         super().__init__(*args, **kwargs)
+        # Adding and cleaning can run at the same time, as in watch mode
+        self._progress: Dict[FileStoreAction, Tuple[int, int, int, int]] = {}
+        self._shown_action: Optional[FileStoreAction] = None
         self.show_idle()
 
-    def _sync_progressbar(self, current, total) -> None:
-        if not self.file_store or not self.file_store.last_action:
+    def _sync_progressbar(
+            self,
+            action: FileStoreAction,
+            current: int,
+            total: int,
+            bytes_done: int,
+            bytes_total: int) -> None:
+        if not self.file_store:
             return
         text = {
             FileStoreAction.ADDING:
@@ -38,8 +49,18 @@ class StatusIndicator(Gtk.Stack):
             FileStoreAction.CLEANING:
                 _("Cleaning file {}/{}").format(current, total),
         }
-        self._progressbar.set_text(text[self.file_store.last_action])
-        self._progressbar.set_fraction(current / total if total > 0 else 0)
+        remaining_time = self.file_store.get_remaining_cleaning_time()
+        if remaining_time is not None:
+            text[FileStoreAction.CLEANING] = _(
+                "Cleaning file {}/{}, {} left").format(
+                    current, total, format_duration(remaining_time))
+        self._progressbar.set_text(text[action])
+        # Bytes reflect the work left better than files of different sizes
+        if bytes_total > 0:
+            self._progressbar.set_fraction(bytes_done / bytes_total)
+        else:
+            self._progressbar.set_fraction(
+                current / total if total > 0 else 0)
 
     @Gtk.Template.Callback()
     def _on_file_store_changed(
@@ -55,9 +76,9 @@ class StatusIndicator(Gtk.Stack):
 
     @Gtk.Template.Callback()
     def _on_cancel_button_clicked(self, button: Gtk.Button) -> None:
-        if self.file_store.last_action == FileStoreAction.ADDING:
+        if self._shown_action == FileStoreAction.ADDING:
             self.file_store.cancel_addding_gfiles()
-        elif self.file_store.last_action == FileStoreAction.CLEANING:
+        elif self._shown_action == FileStoreAction.CLEANING:
             self.file_store.cancel_cleaning_files()
 
     def _on_file_store_state_changed(
@@ -65,35 +86,56 @@ class StatusIndicator(Gtk.Stack):
             file_store: FileStore,
             new_state: FileStoreState) -> None:
         if new_state == FileStoreState.WORKING:
+            # Progress published late by the previous actions is dropped
+            self._progress.clear()
+            self._shown_action = None
             self.show_progressbar()
+            return
+        if file_store.last_action == FileStoreAction.CLEANING:
+            clean_message = ngettext(
+                "%i file cleaned.",
+                "%i files cleaned.",
+                len(file_store.get_cleaned_files())
+            ) % len(file_store.get_cleaned_files())
+            error_message = (ngettext(
+                "%i error occured.",
+                "%i errors occured.",
+                len(file_store.get_errored_files())
+            ) % len(file_store.get_errored_files())
+                if len(file_store.get_errored_files()) > 0
+                else "")
+            self._done_label.set_label(
+                " ".join([clean_message, error_message]))
+            if not self.get_root().is_active():
+                self.send_done_notification()
+        else:
+            self._done_label.set_label("")
+        self.show_done()
 
     def _on_file_store_progress_changed(
             self,
             file_store: FileStore,
+            action: FileStoreAction,
             current: int,
-            total: int) -> None:
-        self._sync_progressbar(current, total)
-        if current == total:
-            if file_store.last_action == FileStoreAction.CLEANING:
-                clean_message = ngettext(
-                    "%i file cleaned.",
-                    "%i files cleaned.",
-                    len(file_store.get_cleaned_files())
-                ) % len(file_store.get_cleaned_files())
-                error_message = (ngettext(
-                    "%i error occured.",
-                    "%i errors occured.",
-                    len(file_store.get_errored_files())
-                ) % len(file_store.get_errored_files())
-                    if len(file_store.get_errored_files()) > 0
-                    else "")
-                self._done_label.set_label(
-                    " ".join([clean_message, error_message]))
-                if not self.get_root().is_active():
-                    self.send_done_notification()
-            else:
-                self._done_label.set_label("")
-            self.show_done()
+            total: int,
+            bytes_done: int,
+            bytes_total: int) -> None:
+        # Reset once the action is done, the File Store then becomes idle
+        if total == 0:
+            return
+        self._progress[action] = (current, total, bytes_done, bytes_total)
+        running = [
+            running_action
+            for running_action, progress in self._progress.items()
+            if progress[0] < progress[1]
+        ]
+        if not running:
+            return
+        # The cleaning is shown over the adding of the next files
+        self._shown_action = FileStoreAction.CLEANING \
+            if FileStoreAction.CLEANING in running else FileStoreAction.ADDING
+        self._sync_progressbar(
+            self._shown_action, *self._progress[self._shown_action])
 
     def show_idle(self) -> None:
         """Show the idle state."""
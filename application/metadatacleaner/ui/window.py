@@ -14,6 +14,7 @@ from metadatacleaner.ui.emptyview import EmptyView
 from metadatacleaner.ui.filechooserdialog import FileChooserDialog
 from metadatacleaner.ui.filesview import FilesView
 from metadatacleaner.ui.folderchooserdialog import FolderChooserDialog
+from metadatacleaner.ui.inspectorwindow import InspectorWindow
 from metadatacleaner.ui.menubutton import MenuButton
 from metadatacleaner.ui.detailsview import DetailsView
 from metadatacleaner.ui.cleaningwarningdialog import CleaningWarningDialog
@@ -54,6 +55,7 @@ class Window(Adw.ApplicationWindow):
         self._setup_about_window()
         self._setup_drop_target()
         self._setup_actions()
+        self._setup_inspector()
 
     # SETUP #
 
@@ -97,7 +99,18 @@ class Window(Adw.ApplicationWindow):
                 file_store.state == FileStoreState.WORKING
                 or len(file_store.get_cleanable_files()) == 0))
 
-        self.file_store = FileStore()
+        def on_active_changed(
+                window: Gtk.Window,
+                pspec: GObject.ParamSpec) -> None:
+            # Tasks of the window the user is looking at are run first
+            self.file_store.priority = 1 if self.is_active() else 0
+
+        self.file_store = FileStore(
+            self.get_application().scheduler,
+            self.get_application().throughput)
+        # Files modified by other programs are checked again
+        self.file_store.monitor_files = True
+        self.connect("notify::is-active", on_active_changed)
         self.file_store.connect("items-changed", on_items_changed)
         self.file_store.connect("file-state-changed", on_state_changed)
         self.file_store.connect("state-changed", on_state_changed)
@@ -106,6 +119,16 @@ class Window(Adw.ApplicationWindow):
             self.file_store,
             "lightweight-mode",
             Gio.SettingsBindFlags.DEFAULT)
+        self.get_application().settings.bind(
+            "deduplicate-files",
+            self.file_store,
+            "deduplicate",
+            Gio.SettingsBindFlags.DEFAULT)
+        self.get_application().settings.bind(
+            "mark-cleaned-files",
+            self.file_store,
+            "mark-cleaned-files",
+            Gio.SettingsBindFlags.DEFAULT)
 
     def _setup_about_window(self) -> None:
         self._about_window.add_acknowledgement_section(
@@ -194,6 +217,8 @@ class Window(Adw.ApplicationWindow):
             self.close_details_view()
             if not self.get_application() \
                     .settings.get_boolean("cleaning-without-warning"):
+                self._cleaning_warning_dialog.set_estimated_duration(
+                    self.file_store.estimate_cleaning_duration())
                 self._cleaning_warning_dialog.show()
                 return
             self.file_store.clean_files()
@@ -202,6 +227,24 @@ class Window(Adw.ApplicationWindow):
         clean_metadata.set_enabled(False)
         self.add_action(clean_metadata)
 
+    def _setup_inspector(self) -> None:
+        if not self.get_application().devel:
+            return
+        inspector_window = None
+
+        def on_show_inspector(action: Gio.Action, parameters: None) -> None:
+            nonlocal inspector_window
+            if inspector_window is None:
+                inspector_window = InspectorWindow(
+                    self.get_application().scheduler,
+                    file_store=self.file_store,
+                    transient_for=self,
+                    destroy_with_parent=True)
+            inspector_window.present()
+        show_inspector = Gio.SimpleAction.new("show-inspector", None)
+        show_inspector.connect("activate", on_show_inspector)
+        self.add_action(show_inspector)
+
     # SIGNALS
 
     @Gtk.Template.Callback()
@@ -230,7 +273,8 @@ class Window(Adw.ApplicationWindow):
         if response == Gtk.ResponseType.ACCEPT:
             self.file_store.add_gfiles(
                 dialog.get_files(),
-                dialog.get_choice("recursive") == "true")
+                dialog.get_choice("recursive") == "true",
+                dialog.get_choice("follow-symlinks") == "true")
 
     @Gtk.Template.Callback()
     def _on_cleaning_warning_dialog_response(
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Generate a deterministic corpus of files carrying metadata.
+
+The same arguments always generate the same files, so that benchmarks run on
+different commits or machines process the same corpus. Only the JPEG files
+depend on the version of GdkPixbuf encoding them.
+
+Usage:
+    python3 benchmarks/corpus.py DIRECTORY [--count N] [--size KIB]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import struct
+import zipfile
+import zlib
+
+from typing import Callable, Dict, List, Tuple
+
+
+# Bumped when the generated files change, to regenerate existing corpora
+CORPUS_VERSION = 1
+
+FORMATS = ["jpeg", "png", "pdf", "odt", "mp3", "zip"]
+
+_DATE_TIME = (2020, 1, 1, 0, 0, 0)
+_AUTHOR = "Jane Doe"
+_SOFTWARE = "Metadata Cleaner Benchmark"
+
+
+def _png(rng: random.Random, size: int) -> bytes:
+    # Random pixels don't compress, so the file is about the size asked for
+    side = max(int((size / 3) ** 0.5), 1)
+    rows = b"".join(
+        b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)),
+        chunk(b"tEXt", b"Author\x00" + _AUTHOR.encode()),
+        chunk(b"tEXt", b"Software\x00" + _SOFTWARE.encode()),
+        chunk(b"tEXt", b"Comment\x00" + rng.randbytes(8).hex().encode()),
+        chunk(b"tIME", struct.pack(">HBBBBB", *_DATE_TIME)),
+        chunk(b"IDAT", zlib.compress(rows)),
+        chunk(b"IEND", b""),
+    ))
+
+
+def _exif_segment(tags: Dict[int, str]) -> bytes:
+    # APP1 segment with a little-endian TIFF structure of ASCII tags
+    entries = sorted(tags.items())
+    data_offset = 8 + 2 + 12 * len(entries) + 4
+    ifd = struct.pack("<H", len(entries))
+    data = b""
+    for tag, value in entries:
+        encoded = value.encode("ascii") + b"\x00"
+        if len(encoded) <= 4:
+            ifd += struct.pack("<HHI", tag, 2, len(encoded))
+            ifd += encoded.ljust(4, b"\x00")
+        else:
+            ifd += struct.pack(
+                "<HHII", tag, 2, len(encoded), data_offset + len(data))
+            data += encoded
+    ifd += struct.pack("<I", 0)
+    payload = b"Exif\x00\x00II*\x00" + struct.pack("<I", 8) + ifd + data
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _jpeg(rng: random.Random, size: int) -> bytes:
+    import gi
+    gi.require_version("GdkPixbuf", "2.0")
+    from gi.repository import GdkPixbuf, GLib
+    # Random pixels take about 2 bytes each once encoded
+    side = max(int((size / 2) ** 0.5), 8)
+    pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(rng.randbytes(side * side * 3)),
+        GdkPixbuf.Colorspace.RGB,
+        False,
+        8,
+        side,
+        side,
+        side * 3)
+    success, data = pixbuf.save_to_bufferv("jpeg", ["quality"], ["90"])
+    if not success:
+        raise RuntimeError("Unable to encode a JPEG image")
+    # The EXIF segment goes after the JFIF segment, if any
+    position = 2
+    if data[2:4] == b"\xff\xe0":
+        position = 4 + struct.unpack(">H", data[4:6])[0]
+    exif = _exif_segment({
+        0x010E: rng.randbytes(8).hex(),
+        0x0131: _SOFTWARE,
+        0x0132: "2020:01:01 00:00:00",
+        0x013B: _AUTHOR,
+    })
+    return data[:position] + exif + data[position:]
+
+
+def _pdf(rng: random.Random, size: int) -> bytes:
+    # Incompressible comments make the page content about the size asked for
+    padding = "".join(
+        f"% {rng.randbytes(32).hex()}\n" for _ in range(max(size // 67, 1)))
+    content = f"0 0 m 200 200 l S\n{padding}".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] "
+        b"/Contents 4 0 R /Resources << >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content)
+        + content + b"\nendstream",
+        f"<< /Author ({_AUTHOR}) /Creator ({_SOFTWARE}) "
+        f"/Producer ({_SOFTWARE}) /Title ({rng.randbytes(8).hex()}) "
+        "/CreationDate (D:20200101000000Z) >>".encode(),
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\n" % (
+        len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+    return pdf
+
+
+def _write_zip(
+        members: List[Tuple[str, bytes, int]],
+        comment: bytes = b"") -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data, compression in members:
+            info = zipfile.ZipInfo(name, _DATE_TIME)
+            info.compress_type = compression
+            archive.writestr(info, data)
+        archive.comment = comment
+    return buffer.getvalue()
+
+
+def _odt(rng: random.Random, size: int) -> bytes:
+    # Hexadecimal text is compressed to about half its size
+    paragraphs = "".join(
+        f"<text:p>{rng.randbytes(32).hex()}</text:p>"
+        for _ in range(max(size // 38, 1)))
+    office = (
+        'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+        'xmlns:meta="urn:oasis:names:tc:opendocument:xmlns:meta:1.0" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'office:version="1.2"')
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f"<office:document-content {office}><office:body><office:text>"
+        f"{paragraphs}</office:text></office:body></office:document-content>")
+    meta = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f"<office:document-meta {office}><office:meta>"
+        f"<meta:generator>{_SOFTWARE}</meta:generator>"
+        f"<meta:initial-creator>{_AUTHOR}</meta:initial-creator>"
+        f"<dc:creator>{_AUTHOR}</dc:creator>"
+        f"<dc:title>{rng.randbytes(8).hex()}</dc:title>"
+        "<meta:creation-date>2020-01-01T00:00:00</meta:creation-date>"
+        "</office:meta></office:document-meta>")
+    manifest = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        "<manifest:manifest "
+        'xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" '
+        'manifest:version="1.2">'
+        '<manifest:file-entry manifest:full-path="/" '
+        'manifest:media-type="application/vnd.oasis.opendocument.text"/>'
+        '<manifest:file-entry manifest:full-path="content.xml" '
+        'manifest:media-type="text/xml"/>'
+        '<manifest:file-entry manifest:full-path="meta.xml" '
+        'manifest:media-type="text/xml"/>'
+        "</manifest:manifest>")
+    return _write_zip([
+        ("mimetype", b"application/vnd.oasis.opendocument.text",
+         zipfile.ZIP_STORED),
+        ("META-INF/manifest.xml", manifest.encode(), zipfile.ZIP_DEFLATED),
+        ("content.xml", content.encode(), zipfile.ZIP_DEFLATED),
+        ("meta.xml", meta.encode(), zipfile.ZIP_DEFLATED),
+    ])
+
+
+def _mp3(rng: random.Random, size: int) -> bytes:
+
+    def text_frame(frame_id: bytes, text: str) -> bytes:
+        data = b"\x00" + text.encode("latin-1")
+        return frame_id + struct.pack(">IH", len(data), 0) + data
+
+    comment = b"\x00eng\x00" + rng.randbytes(8).hex().encode()
+    frames = b"".join((
+        text_frame(b"TIT2", rng.randbytes(8).hex()),
+        text_frame(b"TPE1", _AUTHOR),
+        text_frame(b"TENC", _SOFTWARE),
+        b"COMM" + struct.pack(">IH", len(comment), 0) + comment,
+    ))
+    # Size of the tag, as a synchsafe integer
+    tag_size = bytes(
+        (len(frames) >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    tag = b"ID3\x03\x00\x00" + tag_size + frames
+    # MPEG-1 Layer III frames, 128 kbit/s at 44.1 kHz, of silence
+    mpeg_frame = b"\xff\xfb\x90\x64" + bytes(413)
+    return tag + mpeg_frame * max(size // len(mpeg_frame), 1)
+
+
+def _zip(rng: random.Random, size: int) -> bytes:
+    members = [
+        (f"image-{index}.png", _png(rng, size // 2), zipfile.ZIP_STORED)
+        for index in range(2)
+    ]
+    members.append(
+        ("notes.txt", rng.randbytes(64).hex().encode(), zipfile.ZIP_DEFLATED))
+    return _write_zip(members, comment=_SOFTWARE.encode())
+
+
+_GENERATORS: Dict[str, Tuple[str, Callable[[random.Random, int], bytes]]] = {
+    "jpeg": ("jpg", _jpeg),
+    "png": ("png", _png),
+    "pdf": ("pdf", _pdf),
+    "odt": ("odt", _odt),
+    "mp3": ("mp3", _mp3),
+    "zip": ("zip", _zip),
+}
+
+
+def generate_corpus(
+        directory: str,
+        count: int = 20,
+        size: int = 256,
+        seed: int = 0,
+        formats: List[str] = FORMATS) -> List[str]:
+    """Generate the corpus, unless it was already generated.
+
+    Args:
+        directory (str): Directory to generate the corpus in, with a
+            subdirectory for each format.
+        count (int, optional): Number of files of each format. Defaults
+            to 20.
+        size (int, optional): Approximate size of each file in KiB. Defaults
+            to 256.
+        seed (int, optional): Seed of the content of the files. Defaults
+            to 0.
+        formats (List[str], optional): Formats of the files. Defaults to all
+            the formats.
+
+    Returns:
+        List[str]: Paths of the files.
+    """
+    parameters = {
+        "version": CORPUS_VERSION,
+        "count": count,
+        "size": size,
+        "seed": seed,
+        "formats": formats,
+    }
+    manifest_path = os.path.join(directory, "corpus.json")
+    files = []
+    for fmt in formats:
+        extension, generator = _GENERATORS[fmt]
+        for index in range(count):
+            files.append((
+                os.path.join(directory, fmt, f"{fmt}-{index:05}.{extension}"),
+                generator,
+                f"{seed}-{fmt}-{index}"))
+    paths = [path for path, generator, file_seed in files]
+    try:
+        with open(manifest_path) as f:
+            if json.load(f) == parameters:
+                return paths
+    except (OSError, ValueError):
+        pass
+    for path, generator, file_seed in files:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(generator(random.Random(file_seed), size * 1024))
+    with open(manifest_path, "w") as f:
+        json.dump(parameters, f)
+    return paths
+
+
+def main() -> None:
+    """Generate a corpus from the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument(
+        "--count", type=int, default=20, help="files of each format")
+    parser.add_argument(
+        "--size", type=int, default=256, help="size of each file in KiB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    args = parser.parse_args()
+    paths = generate_corpus(
+        args.directory, args.count, args.size, args.seed, args.formats)
+    print(f"{len(paths)} files in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
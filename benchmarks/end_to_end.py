@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Benchmark the adding and cleaning of a synthetic corpus, end to end.
+
+The corpus is generated by corpus.py, then added to a File Store and cleaned
+in a temporary output directory, without any window. The wall time, files per
+second, megabytes per second and peak resident set size of each phase are
+reported, as the median of several runs. Each run is done in its own process,
+so that the peak resident set size of a run doesn't include the previous
+ones.
+
+Usage:
+    python3 benchmarks/end_to_end.py [--count N] [--size KIB] [--runs N]
+        [--json RESULTS]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import suppress
+from typing import Any, Dict, List
+
+from corpus import FORMATS, generate_corpus
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(REPOSITORY_DIR, "application"))
+
+from gi.repository import Gio, GLib  # noqa: E402
+
+from metadatacleaner.modules.filestore import \
+    FileStore, FileStoreAction, FileStoreState  # noqa: E402
+
+
+def _reset_peak_resident_set_size() -> None:
+    # Only supported by Linux, the peak since the start of the process is
+    # reported otherwise
+    with suppress(OSError):
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+
+
+def _get_peak_resident_set_size() -> int:
+    with suppress(OSError):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    # In kibibytes
+                    return int(line.split()[1]) * 1024
+    # In kibibytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPOSITORY_DIR,
+            capture_output=True,
+            text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_once(
+        corpus_dir: str,
+        output_dir: str,
+        lightweight: bool = False) -> Dict[str, Dict[str, float]]:
+    """Add and clean the corpus once.
+
+    Args:
+        corpus_dir (str): Directory of the corpus.
+        output_dir (str): Directory the cleaned files are written to.
+        lightweight (bool, optional): Use the lightweight cleaning. Defaults
+            to False.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Measures of the "add" and "clean" phases.
+    """
+    loop = GLib.MainLoop()
+    file_store = FileStore()
+    file_store.lightweight_mode = lightweight
+    results: Dict[str, Dict[str, float]] = {}
+    start_time = time.perf_counter()
+
+    def on_state_changed(
+            file_store: FileStore,
+            state: FileStoreState) -> None:
+        nonlocal start_time
+        if state != FileStoreState.IDLE:
+            return
+        duration = time.perf_counter() - start_time
+        if file_store.last_action == FileStoreAction.ADDING:
+            phase = "add"
+            files = file_store.get_files()
+        else:
+            phase = "clean"
+            files = file_store.get_cleaned_files()
+        size = sum(f.size for f in files)
+        results[phase] = {
+            "files": len(files),
+            "bytes": size,
+            "wall_time": duration,
+            "files_per_second": len(files) / duration,
+            "megabytes_per_second": size / 1024 / 1024 / duration,
+            "peak_rss": _get_peak_resident_set_size(),
+        }
+        if phase == "add":
+            _reset_peak_resident_set_size()
+            start_time = time.perf_counter()
+            file_store.clean_files(output_dir)
+        else:
+            loop.quit()
+
+    file_store.connect("state-changed", on_state_changed)
+    _reset_peak_resident_set_size()
+    file_store.add_gfiles([Gio.File.new_for_path(corpus_dir)])
+    loop.run()
+    file_store.remove_files()
+    return results
+
+
+def run_in_subprocess(
+        corpus_dir: str,
+        output_dir: str,
+        lightweight: bool = False) -> Dict[str, Dict[str, float]]:
+    """Add and clean the corpus once, in a new process.
+
+    Args:
+        corpus_dir (str): Directory of the corpus.
+        output_dir (str): Directory the cleaned files are written to.
+        lightweight (bool, optional): Use the lightweight cleaning. Defaults
+            to False.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Measures of the "add" and "clean" phases.
+    """
+    # The standard output also gets the messages of the application
+    with tempfile.NamedTemporaryFile("r", suffix=".json") as results_file:
+        args = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--corpus", corpus_dir,
+            "--run-once", output_dir,
+            "--json", results_file.name,
+        ]
+        if lightweight:
+            args.append("--lightweight")
+        subprocess.run(args, check=True)
+        return json.load(results_file)
+
+
+def summarize(runs: List[Dict[str, Dict[str, float]]]) -> Dict:
+    """Compute the median of the measures of several runs.
+
+    Args:
+        runs (List[Dict[str, Dict[str, float]]]): Measures of the runs.
+
+    Returns:
+        Dict: Median of each measure of each phase.
+    """
+    return {
+        phase: {
+            measure: statistics.median(run[phase][measure] for run in runs)
+            for measure in runs[0][phase]
+        }
+        for phase in runs[0]
+    }
+
+
+def main() -> None:
+    """Run the benchmark from the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--corpus",
+        default=os.path.join(tempfile.gettempdir(), "metadata-cleaner-corpus"),
+        help="directory of the corpus, generated if needed")
+    parser.add_argument(
+        "--count", type=int, default=20, help="files of each format")
+    parser.add_argument(
+        "--size", type=int, default=256, help="size of each file in KiB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--lightweight", action="store_true")
+    parser.add_argument("--json", help="file to write the results to")
+    # Used by run_in_subprocess(), to run once in the given output directory
+    parser.add_argument("--run-once", metavar="OUTPUT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_once:
+        with open(args.json, "w") as f:
+            json.dump(
+                run_once(args.corpus, args.run_once, args.lightweight), f)
+        return
+
+    generate_corpus(
+        args.corpus, args.count, args.size, args.seed, args.formats)
+    runs = []
+    for run in range(args.runs):
+        output_dir = tempfile.mkdtemp(prefix="metadata-cleaner-benchmark-")
+        try:
+            runs.append(run_in_subprocess(
+                args.corpus, output_dir, args.lightweight))
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    results: Dict[str, Any] = {
+        "commit": _get_commit(),
+        "parameters": {
+            "count": args.count,
+            "size": args.size,
+            "seed": args.seed,
+            "formats": args.formats,
+            "runs": args.runs,
+            "lightweight": args.lightweight,
+        },
+        "phases": summarize(runs),
+    }
+    for phase, measures in results["phases"].items():
+        print(
+            f"{phase:>5}: {measures['files']:.0f} files in "
+            f"{measures['wall_time']:.3f} s, "
+            f"{measures['files_per_second']:.1f} files/s, "
+            f"{measures['megabytes_per_second']:.2f} MB/s, "
+            f"peak RSS {measures['peak_rss'] / 1024 / 1024:.0f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
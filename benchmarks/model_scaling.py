@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Benchmark the overhead of the File Store as the number of files grows.
+
+The files are empty and handled by a stub parser taking a fixed time to read
+and remove their metadata, so that only the work of the application itself
+is measured: gathering the files, checking for duplicates, dispatching to the
+main loop, updating the list model and querying it. The overhead per file
+should stay about the same whatever the number of files; if it grows with
+it, some work is quadratic.
+
+Usage:
+    python3 benchmarks/model_scaling.py [--files 10000 100000 1000000]
+        [--latency MS] [--json RESULTS]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(REPOSITORY_DIR, "application"))
+
+from gi.repository import Gio, GLib  # noqa: E402
+
+from metadatacleaner.modules.dispatcher import \
+    DEFAULT_DISPATCHER, Dispatcher, ImmediateDispatcher  # noqa: E402
+from metadatacleaner.modules.filestore import \
+    FileStore, FileStoreAction, FileStoreState  # noqa: E402
+from metadatacleaner.modules.scheduler import Scheduler  # noqa: E402
+from metadatacleaner.modules.tracing import \
+    get_pending_idle_callbacks  # noqa: E402
+
+
+# Files per directory of the synthetic tree
+_FILES_PER_DIRECTORY = 1000
+# Interval between two measures of the main loop latency, in milliseconds
+_PROBE_INTERVAL = 10
+
+
+class StubParser:
+    """Parser taking a fixed time to read and remove the metadata."""
+
+    def __init__(self, path: str, latency: float) -> None:
+        """Stub parser initialization.
+
+        Args:
+            path (str): Path of the file.
+            latency (float): Time taken by each operation, in seconds.
+        """
+        self.path = path
+        self.latency = latency
+        self.output_filename = ""
+        self.lightweight_cleaning = False
+
+    def get_meta(self) -> Dict[str, str]:
+        """Get the metadata of the file."""
+        time.sleep(self.latency)
+        return {"Author": "Jane Doe", "Software": "Benchmark"}
+
+    def remove_all(self) -> bool:
+        """Write the file without its metadata."""
+        time.sleep(self.latency)
+        open(self.output_filename, "wb").close()
+        return True
+
+
+class MainLoopProbe:
+    """Measure of how late the main loop dispatches a periodic callback."""
+
+    def __init__(self) -> None:
+        """Probe initialization."""
+        self.latencies: List[float] = []
+        self.max_pending_idle_callbacks = 0
+        self._expected = 0.0
+        self._source_id: Optional[int] = None
+
+    def start(self) -> None:
+        """Start measuring."""
+        self._expected = time.perf_counter() + _PROBE_INTERVAL / 1000
+        self._source_id = GLib.timeout_add(_PROBE_INTERVAL, self._on_timeout)
+
+    def stop(self) -> None:
+        """Stop measuring."""
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _on_timeout(self) -> bool:
+        now = time.perf_counter()
+        self.latencies.append(max(now - self._expected, 0))
+        self._expected = now + _PROBE_INTERVAL / 1000
+        self.max_pending_idle_callbacks = max(
+            self.max_pending_idle_callbacks, get_pending_idle_callbacks())
+        return GLib.SOURCE_CONTINUE
+
+    def summarize(self) -> Dict[str, float]:
+        """Summarize the latencies.
+
+        Returns:
+            Dict[str, float]: Median, 99th percentile and maximum latency in
+                milliseconds, and maximum of pending idle callbacks.
+        """
+        latencies = sorted(self.latencies) or [0.0]
+        return {
+            "latency_median_ms": statistics.median(latencies) * 1000,
+            "latency_p99_ms":
+                latencies[int(len(latencies) * 0.99)] * 1000,
+            "latency_max_ms": latencies[-1] * 1000,
+            "max_pending_idle_callbacks": self.max_pending_idle_callbacks,
+        }
+
+
+def create_tree(directory: str, files: int) -> None:
+    """Create empty files, unless they already exist.
+
+    Args:
+        directory (str): Directory to create the files in.
+        files (int): Number of files.
+    """
+    marker = os.path.join(directory, ".complete")
+    if os.path.exists(marker):
+        return
+    for index in range(files):
+        subdirectory = os.path.join(
+            directory, f"{index // _FILES_PER_DIRECTORY:05}")
+        if index % _FILES_PER_DIRECTORY == 0:
+            os.makedirs(subdirectory, exist_ok=True)
+        open(os.path.join(subdirectory, f"{index:07}.jpg"), "wb").close()
+    open(marker, "wb").close()
+
+
+def drain_main_context() -> None:
+    """Run the callbacks pending in the default main context."""
+    context = GLib.MainContext.default()
+    while context.pending():
+        context.iteration(False)
+
+
+def _time(function: Any, *args: Any) -> float:
+    start_time = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start_time
+
+
+def run(
+        directory: str,
+        output_dir: str,
+        files: int,
+        latency: float,
+        workers: int,
+        dispatcher: Dispatcher = DEFAULT_DISPATCHER) -> Dict[str, Any]:
+    """Add and clean the files, measuring the overhead.
+
+    Args:
+        directory (str): Directory of the files.
+        output_dir (str): Directory the cleaned files are written to.
+        files (int): Number of files.
+        latency (float): Time taken by each operation of the stub parser, in
+            seconds.
+        workers (int): Number of workers of the scheduler.
+        dispatcher (Dispatcher, optional): Dispatcher of the File Store.
+            Defaults to the GLib main loop.
+
+    Returns:
+        Dict[str, Any]: Measures of the "add" and "clean" phases, and of the
+            queries of the model.
+    """
+
+    def get_parser(path: str) -> Tuple[StubParser, str]:
+        return StubParser(path, latency), "image/jpeg"
+
+    context = GLib.MainContext.default()
+    file_store = FileStore(
+        Scheduler(workers), get_parser=get_parser, dispatcher=dispatcher)
+    results: Dict[str, Any] = {"files": files}
+    items_changed = 0
+    idle = False
+
+    def on_items_changed(*args: Any) -> None:
+        nonlocal items_changed
+        items_changed += 1
+
+    def on_state_changed(
+            file_store: FileStore,
+            state: FileStoreState) -> None:
+        nonlocal idle
+        if state == FileStoreState.IDLE:
+            # Can be emitted from a worker thread by the immediate dispatcher
+            idle = True
+            context.wakeup()
+
+    def run_phase(start: Callable[[], None]) -> Dict[str, Any]:
+        nonlocal items_changed, idle
+        items_changed = 0
+        idle = False
+        probe = MainLoopProbe()
+        probe.start()
+        start_time = time.perf_counter()
+        start()
+        while not idle:
+            context.iteration(True)
+        # The updates of the model dispatched last are part of the phase
+        drain_main_context()
+        duration = time.perf_counter() - start_time
+        probe.stop()
+        # Time the stub parser would take with perfect parallelism
+        ideal = files * latency / workers
+        return {
+            "wall_time": duration,
+            "microseconds_per_file": duration / files * 1e6,
+            "overhead_microseconds_per_file":
+                max(duration - ideal, 0) / files * 1e6,
+            "items_changed": items_changed,
+            **probe.summarize(),
+        }
+
+    file_store.connect("items-changed", on_items_changed)
+    file_store.connect("state-changed", on_state_changed)
+    results["add"] = run_phase(
+        lambda: file_store.add_gfiles([Gio.File.new_for_path(directory)]))
+    last_file = file_store.get_file_with_index(len(file_store) - 1)
+    results["queries"] = {
+        "get_cleanable_files_ms":
+            _time(file_store.get_cleanable_files) * 1000,
+        "get_index_of_file_ms":
+            _time(file_store.get_index_of_file, last_file) * 1000,
+    }
+    results["clean"] = run_phase(lambda: file_store.clean_files(output_dir))
+    file_store.remove_files()
+    return results
+
+
+def main() -> None:
+    """Run the benchmark from the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--files",
+        type=int,
+        nargs="+",
+        default=[10000, 100000],
+        help="numbers of files to run the benchmark with")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="time taken by each operation of the stub parser, in ms")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Scheduler().max_workers,
+        help="number of workers of the scheduler")
+    parser.add_argument(
+        "--dispatcher",
+        choices=["glib", "immediate"],
+        default="glib",
+        help="run the callbacks of the workers in the main loop or at once")
+    parser.add_argument(
+        "--tree",
+        default=os.path.join(tempfile.gettempdir(), "metadata-cleaner-tree"),
+        help="directory of the synthetic files, created if needed")
+    parser.add_argument("--json", help="file to write the results to")
+    args = parser.parse_args()
+
+    all_results = []
+    for files in args.files:
+        directory = os.path.join(args.tree, str(files))
+        create_tree(directory, files)
+        output_dir = tempfile.mkdtemp(prefix="metadata-cleaner-benchmark-")
+        try:
+            results = run(
+                directory,
+                output_dir,
+                files,
+                args.latency / 1000,
+                args.workers,
+                ImmediateDispatcher() if args.dispatcher == "immediate"
+                else DEFAULT_DISPATCHER)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        all_results.append(results)
+        print(f"{files} files:")
+        for phase in ("add", "clean"):
+            measures = results[phase]
+            print(
+                f"  {phase:>5}: {measures['wall_time']:.2f} s, "
+                f"{measures['overhead_microseconds_per_file']:.1f} µs "
+                "overhead per file, main loop latency "
+                f"p99 {measures['latency_p99_ms']:.1f} ms "
+                f"max {measures['latency_max_ms']:.1f} ms, "
+                f"{measures['max_pending_idle_callbacks']} pending idles")
+        print(
+            "  get_cleanable_files: "
+            f"{results['queries']['get_cleanable_files_ms']:.2f} ms, "
+            "get_index_of_file: "
+            f"{results['queries']['get_index_of_file_ms']:.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
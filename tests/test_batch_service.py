@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Test the D-Bus batch service on a private bus."""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from threading import Event
+from typing import Callable, List, Optional
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(REPOSITORY_DIR, "application"))
+
+from gi.repository import Gio, GLib  # noqa: E402
+
+from metadatacleaner.modules.batchservice import BatchService, \
+    INTERFACE_NAME  # noqa: E402
+from metadatacleaner.modules.scheduler import Scheduler  # noqa: E402
+from metadatacleaner.modules.throughput import ThroughputDatabase  # noqa: E402
+
+
+_OBJECT_PATH = "/fr/romainvigier/MetadataCleaner"
+# Time in seconds to wait for the service
+_TIMEOUT = 10.0
+
+
+class _Settings:
+    """Settings with every option disabled."""
+
+    def get_boolean(self, key: str) -> bool:
+        """Get the value of a boolean setting."""
+        return False
+
+
+class _Application:
+    """Application providing what the batch service needs."""
+
+    def __init__(self, directory: str) -> None:
+        """Application initialization.
+
+        Args:
+            directory (str): Directory to store the throughput in.
+        """
+        self.scheduler = Scheduler(max_workers=2)
+        self.throughput = ThroughputDatabase(
+            os.path.join(directory, "throughput.sqlite"))
+        self.hold_count = 0
+        self._settings = _Settings()
+
+    def get_property(self, name: str) -> _Settings:
+        """Get the settings of the application."""
+        return self._settings
+
+    def hold(self) -> None:
+        """Hold the application."""
+        self.hold_count += 1
+
+    def release(self) -> None:
+        """Release the application."""
+        self.hold_count -= 1
+
+
+class BatchServiceTestCase(unittest.TestCase):
+    """Batch service exported on a private session bus."""
+
+    def setUp(self) -> None:
+        """Start a private bus and export the service on it."""
+        self.directory = tempfile.mkdtemp(prefix="metadata-cleaner-test-")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.bus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
+        self.bus.up()
+        self.addCleanup(self.bus.down)
+        flags = Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT \
+            | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+        address = self.bus.get_bus_address()
+        self.service_connection = Gio.DBusConnection.new_for_address_sync(
+            address, flags, None, None)
+        self.addCleanup(self.service_connection.close_sync, None)
+        self.client_connection = Gio.DBusConnection.new_for_address_sync(
+            address, flags, None, None)
+        self.addCleanup(self.client_connection.close_sync, None)
+        self.application = _Application(self.directory)
+        self.service = BatchService(
+            self.application, self.service_connection, _OBJECT_PATH)
+        self.service.register()
+        self.addCleanup(self.service.unregister)
+        self.finished_jobs: List[GLib.Variant] = []
+        subscription_id = self.client_connection.signal_subscribe(
+            None,
+            INTERFACE_NAME,
+            "JobFinished",
+            _OBJECT_PATH,
+            None,
+            Gio.DBusSignalFlags.NONE,
+            self._on_job_finished)
+        self.addCleanup(
+            self.client_connection.signal_unsubscribe, subscription_id)
+
+    def _on_job_finished(self, connection, sender, object_path,
+                         interface_name, signal_name, parameters) -> None:
+        self.finished_jobs.append(parameters.unpack())
+
+    def _run_until(self, predicate: Callable[[], bool]) -> None:
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + _TIMEOUT
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the batch service.")
+            if not context.iteration(False):
+                time.sleep(0.01)
+
+    def _call(
+            self,
+            method_name: str,
+            parameters: GLib.Variant) -> GLib.Variant:
+        # The service runs on the same main context, the call can't block it
+        results: List[GLib.Variant] = []
+        errors: List[GLib.Error] = []
+
+        def on_reply(connection: Gio.DBusConnection,
+                     result: Gio.AsyncResult) -> None:
+            try:
+                results.append(connection.call_finish(result))
+            except GLib.Error as e:
+                errors.append(e)
+
+        self.client_connection.call(
+            self.service_connection.get_unique_name(),
+            _OBJECT_PATH,
+            INTERFACE_NAME,
+            method_name,
+            parameters,
+            None,
+            Gio.DBusCallFlags.NONE,
+            -1,
+            None,
+            on_reply)
+        self._run_until(lambda: bool(results or errors))
+        if errors:
+            raise errors[0]
+        return results[0]
+
+    def _submit(
+            self,
+            paths: List[str],
+            output_root: Optional[str] = None) -> str:
+        options = {}
+        if output_root:
+            options["output-directory"] = GLib.Variant("s", output_root)
+        result = self._call(
+            "SubmitPaths", GLib.Variant("(asa{sv})", (paths, options)))
+        return result.unpack()[0]
+
+    def test_jobs_finish(self) -> None:
+        """Submitted jobs run until they are finished."""
+        path = os.path.join(self.directory, "file.txt")
+        with open(path, "w") as f:
+            f.write("Content")
+        job_id = self._submit([path])
+        self._run_until(lambda: bool(self.finished_jobs))
+        self.assertEqual(self.finished_jobs, [(job_id, "finished")])
+        status = self._call("GetJobStatus", GLib.Variant("(s)", (job_id,)))
+        self.assertEqual(status.unpack()[0], "finished")
+        self.assertEqual(self.application.hold_count, 0)
+
+    def test_jobs_have_distinct_ids(self) -> None:
+        """Each submitted job gets its own ID."""
+        first_job_id = self._submit([self.directory])
+        second_job_id = self._submit([self.directory])
+        self.assertNotEqual(first_job_id, second_job_id)
+        self._run_until(lambda: len(self.finished_jobs) == 2)
+
+    def test_relative_paths_are_rejected(self) -> None:
+        """Relative paths are rejected without creating a job."""
+        with self.assertRaises(GLib.Error) as context:
+            self._submit(["file.txt"])
+        self.assertIn("InvalidArgs", context.exception.message)
+        self.assertEqual(self.application.hold_count, 0)
+
+    def test_relative_output_directories_are_rejected(self) -> None:
+        """Relative output directories are rejected."""
+        with self.assertRaises(GLib.Error) as context:
+            self._submit([self.directory], output_root="output")
+        self.assertIn("InvalidArgs", context.exception.message)
+
+    def test_unknown_jobs_are_rejected(self) -> None:
+        """Unknown job IDs are rejected."""
+        with self.assertRaises(GLib.Error) as context:
+            self._call("GetJobStatus", GLib.Variant("(s)", ("unknown",)))
+        self.assertIn("UnknownJob", context.exception.message)
+
+    def test_jobs_can_be_cancelled(self) -> None:
+        """Cancelled jobs are reported as such."""
+        # Keep the workers busy so that the job can't finish before
+        release = Event()
+        self.addCleanup(release.set)
+        client = self.application.scheduler.create_client()
+        for _ in range(self.application.scheduler.max_workers):
+            client.submit(release.wait)
+        path = os.path.join(self.directory, "file.txt")
+        with open(path, "w") as f:
+            f.write("Content")
+        job_id = self._submit([path])
+        self._call("CancelJob", GLib.Variant("(s)", (job_id,)))
+        release.set()
+        self._run_until(lambda: bool(self.finished_jobs))
+        self.assertEqual(self.finished_jobs, [(job_id, "cancelled")])
+        status = self._call("GetJobStatus", GLib.Variant("(s)", (job_id,)))
+        self.assertEqual(status.unpack()[0], "cancelled")
+
+
+if __name__ == "__main__":
+    unittest.main()
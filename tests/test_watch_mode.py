@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Metadata Cleaner contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Test the watch mode of the File Store on a temporary directory."""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from typing import Callable, Dict, Optional, Tuple
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(REPOSITORY_DIR, "application"))
+
+from gi.repository import Gio, GLib  # noqa: E402
+
+from metadatacleaner.modules.file import File, FileState  # noqa: E402
+from metadatacleaner.modules.filestore import FileStore  # noqa: E402
+
+
+# Delay in milliseconds without writes after which a file is added
+_SETTLE_DELAY = 100
+# Time in seconds to wait for the files to be cleaned
+_TIMEOUT = 10.0
+
+
+class StubParser:
+    """Parser finding metadata in non-empty files, and emptying them."""
+
+    def __init__(self, path: str) -> None:
+        """Stub parser initialization.
+
+        Args:
+            path (str): Path of the file.
+        """
+        self.path = path
+        self.output_filename = ""
+        self.lightweight_cleaning = False
+
+    def get_meta(self) -> Dict[str, str]:
+        """Get the metadata of the file."""
+        return {"Comment": "Test"} if os.path.getsize(self.path) else {}
+
+    def remove_all(self) -> bool:
+        """Write the file without its metadata."""
+        open(self.output_filename, "wb").close()
+        return True
+
+
+def _get_parser(path: str) -> Tuple[StubParser, str]:
+    return StubParser(path), "image/jpeg"
+
+
+class WatchModeTestCase(unittest.TestCase):
+    """Watch mode of the File Store."""
+
+    def setUp(self) -> None:
+        """Create a File Store and the directory to watch."""
+        self.directory = tempfile.mkdtemp(prefix="metadata-cleaner-test-")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.file_store = FileStore(get_parser=_get_parser)
+        self.addCleanup(self.file_store.remove_files)
+        self.addCleanup(self.file_store.stop_watching)
+
+    def _write(self, filename: str, content: bytes = b"metadata") -> str:
+        path = os.path.join(self.directory, filename)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def _watch(self) -> None:
+        self.file_store.watch_gfiles(
+            [Gio.File.new_for_path(self.directory)],
+            settle_delay=_SETTLE_DELAY)
+
+    def _get_file(self, path: str) -> Optional[File]:
+        return next(
+            (f for f in self.file_store.get_files() if f.path == path), None)
+
+    def _is_cleaned(self, path: str, previous: Optional[File] = None) -> bool:
+        f = self._get_file(path)
+        return f is not None and f is not previous \
+            and f.state == FileState.CLEANED
+
+    def _run_until(self, predicate: Callable[[], bool]) -> None:
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + _TIMEOUT
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the files to be cleaned.")
+            if not context.iteration(False):
+                time.sleep(0.01)
+
+    def test_existing_files_are_cleaned(self) -> None:
+        """Files present before watching are cleaned."""
+        path = self._write("existing.jpg")
+        self._watch()
+        self._run_until(lambda: self._is_cleaned(path))
+        self.assertEqual(os.path.getsize(path), 0)
+
+    def test_new_files_are_cleaned(self) -> None:
+        """Files written to the folder are added and cleaned."""
+        self._watch()
+        path = self._write("new.jpg")
+        self._run_until(lambda: self._is_cleaned(path))
+        self.assertEqual(os.path.getsize(path), 0)
+        self.assertEqual(len(self.file_store), 1)
+
+    def test_modified_files_are_cleaned_again(self) -> None:
+        """Files written to again after their cleaning are cleaned again."""
+        path = self._write("modified.jpg")
+        self._watch()
+        self._run_until(lambda: self._is_cleaned(path))
+        first = self._get_file(path)
+        self._write("modified.jpg")
+        self._run_until(lambda: self._is_cleaned(path, first))
+        self.assertEqual(os.path.getsize(path), 0)
+        self.assertEqual(len(self.file_store), 1)
+
+    def test_modified_identical_files_are_cleaned_again(self) -> None:
+        """Files identical to others are detached when they are modified."""
+        self.file_store.deduplicate = True
+        path = self._write("identical.jpg")
+        other_path = self._write("other.jpg")
+        self._watch()
+        self._run_until(
+            lambda: self._is_cleaned(path) and self._is_cleaned(other_path))
+        first = self._get_file(other_path)
+        self._write("other.jpg", b"other metadata")
+        self._run_until(lambda: self._is_cleaned(other_path, first))
+        f = self._get_file(other_path)
+        assert f is not None
+        self.assertIsNone(f.duplicate_of)
+        self.assertEqual(f.duplicates, [])
+        self.assertEqual(os.path.getsize(other_path), 0)
+        self.assertEqual(len(self.file_store), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()